@@ -1,54 +1,322 @@
-from flask import Flask, jsonify
-import psycopg2
+import base64
+import json
+import os
+import queue
+import time
+import zlib
+from datetime import datetime
+
+from flask import Flask, Response, g, jsonify, request
 from flask_cors import CORS
 
+from change_feed import ChangeFeed
+from hardware import metrics
+from hardware.db_pool import get_db_connection
+
+# Optional speedups: orjson for encoding rows, brotli for Accept-Encoding: br
+try:
+    import orjson
+except ImportError:
+    orjson = None
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
 app = Flask(__name__)
 CORS(app)  # Enable CORS for frontend access
 
-# Database connection configuration
-DB_CONFIG = {
-    "dbname": "parking_system",
-    "user": "jodos",
-    "password": "jodos",
-    "host": "localhost",
-    "port": "5432",
-}
+request_seconds = metrics.histogram(
+    "api_request_seconds",
+    "Backend API latency until the response starts (streamed bodies excluded)",
+    ["endpoint", "method", "status"],
+)
+
+# Pagination
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+
+# Revenue buckets returned by /api/stats
+STATS_HOURS = 24
+MAX_STATS_HOURS = 24 * 7
+STATS_DAYS = 30
+MAX_STATS_DAYS = 366
+
+EVENT_HEARTBEAT = 15  # seconds between keep-alives on /api/events
+
+# Streamed list responses
+STREAM_CHUNK_ROWS = 200  # rows per server-side cursor fetch and response chunk
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+
+
+def dumps(value):
+    """JSON-encode to bytes, with orjson when it is installed"""
+    if orjson is not None:
+        return orjson.dumps(value)
+    return json.dumps(value, separators=(",", ":")).encode()
+
+
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+
+
+@app.after_request
+def record_request_latency(response):
+    started = g.pop("request_started", None)
+    if started is not None:
+        request_seconds.labels(
+            endpoint=request.endpoint or "unknown",
+            method=request.method,
+            status=response.status_code,
+        ).observe(time.perf_counter() - started)
+    return response
+
+
+def encode_cursor(timestamp, row_id):
+    """Opaque keyset cursor for the (timestamp, id) of the last row on a page"""
+    raw = f"{timestamp.isoformat()}|{row_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode()
+
+
+def decode_cursor(cursor):
+    try:
+        timestamp, row_id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+        return datetime.fromisoformat(timestamp), int(row_id)
+    except ValueError:
+        raise ValueError(f"Invalid cursor: {cursor}")
+
+
+def parse_bool(name, value):
+    if value.lower() in ("true", "1"):
+        return True
+    if value.lower() in ("false", "0"):
+        return False
+    raise ValueError(f"Invalid value for {name}: {value}")
+
+
+def parse_timestamp(name, value):
+    try:
+        return datetime.fromisoformat(value)
+    except ValueError:
+        raise ValueError(f"Invalid timestamp for {name}: {value}")
+
+
+def parse_limit(value):
+    if value is None:
+        return DEFAULT_PAGE_SIZE
+    try:
+        limit = int(value)
+    except ValueError:
+        raise ValueError(f"Invalid limit: {value}")
+    return max(1, min(limit, MAX_PAGE_SIZE))
+
+
+def build_page_query(columns, table, time_column, filters):
+    """
+    Build a keyset-paginated query ordered by (time_column, id) DESC.
+    `filters` maps column names to already-parsed equality values; the
+    since/until/cursor/limit parameters are read from the request.
+    """
+    clauses, params = [], []
+    since = request.args.get("since")
+    until = request.args.get("until")
+    cursor = request.args.get("cursor")
+    limit = parse_limit(request.args.get("limit"))
+
+    if since:
+        clauses.append(f"{time_column} >= %s")
+        params.append(parse_timestamp("since", since))
+    if until:
+        clauses.append(f"{time_column} < %s")
+        params.append(parse_timestamp("until", until))
+    for column, value in filters.items():
+        if value is not None:
+            clauses.append(f"{column} = %s")
+            params.append(value)
+    if cursor:
+        clauses.append(f"({time_column}, id) < (%s, %s)")
+        params.extend(decode_cursor(cursor))
+
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+    # Fetch one extra row to know whether another page exists
+    query = f"""
+        SELECT {columns}
+        FROM {table}
+        {where}
+        ORDER BY {time_column} DESC, id DESC
+        LIMIT %s
+    """
+    params.append(limit + 1)
+    return query, params, limit
+
+
+def table_validators(table):
+    """
+    (etag, last_modified) for a whole table from its newest id and updated_at
+    (both indexed). Any insert or update changes one of them. They are read
+    before the page itself, so a response is never older than its validators.
+    """
+    with get_db_connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute(
+                f"""
+                SELECT max(id), max(updated_at) AT TIME ZONE current_setting('TimeZone')
+                FROM {table}
+                """
+            )
+            max_id, last_modified = cur.fetchone()
+    stamp = int(last_modified.timestamp() * 1_000_000) if last_modified else 0
+    return f"{table}-{max_id or 0}-{stamp}", last_modified
+
+
+def is_not_modified(etag, last_modified):
+    # If-None-Match takes precedence over If-Modified-Since (RFC 9110)
+    if request.if_none_match:
+        return request.if_none_match.contains_weak(etag)
+    if last_modified is not None and request.if_modified_since is not None:
+        return last_modified.replace(microsecond=0) <= request.if_modified_since
+    return False
+
+
+def content_encoding():
+    encodings = ["br", "gzip"] if brotli is not None else ["gzip"]
+    return request.accept_encodings.best_match(encodings)
+
+
+def compress_stream(chunks, encoding):
+    if encoding == "br":
+        compressor = brotli.Compressor(quality=BROTLI_QUALITY)
+        compress, finish = compressor.process, compressor.finish
+    else:
+        compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+        compress, finish = compressor.compress, compressor.flush
+    try:
+        for chunk in chunks:
+            data = compress(chunk)
+            if data:
+                yield data
+        yield finish()
+    finally:
+        # Returns the page's connection even if the client went away
+        chunks.close()
+
 
+def stream_page(query, params, limit, time_index, format_row):
+    """
+    Stream one page as {"items": [...], "next_cursor": ...}. Rows come from a
+    named (server-side) cursor and are encoded STREAM_CHUNK_ROWS at a time,
+    so memory stays flat whatever the page size.
+    """
 
-def get_db_connection():
-    return psycopg2.connect(**DB_CONFIG)
+    def generate():
+        with get_db_connection() as conn:
+            with conn.cursor(name="page") as cur:
+                cur.itersize = STREAM_CHUNK_ROWS
+                cur.execute(query, params)
+                yield b""
+
+                yield b'{"items":['
+                count, last, chunk, next_cursor = 0, None, [], None
+                for row in cur:
+                    if count == limit:
+                        # The extra row: another page exists
+                        next_cursor = encode_cursor(last[time_index], last[0])
+                        break
+                    chunk.append(dumps(format_row(row)))
+                    count, last = count + 1, row
+                    if len(chunk) == STREAM_CHUNK_ROWS:
+                        yield (b"," if count > len(chunk) else b"") + b",".join(chunk)
+                        chunk = []
+                if chunk:
+                    yield (b"," if count > len(chunk) else b"") + b",".join(chunk)
+                yield b'],"next_cursor":' + dumps(next_cursor) + b"}"
+
+    rows = generate()
+    # Run the query before the status line goes out, so errors still get a 500
+    next(rows)
+    return rows
+
+
+def page_response(table, query, params, limit, time_index, format_row):
+    etag, last_modified = table_validators(table)
+    if is_not_modified(etag, last_modified):
+        response = Response(status=304)
+    else:
+        body = stream_page(query, params, limit, time_index, format_row)
+        encoding = content_encoding()
+        if encoding:
+            body = compress_stream(body, encoding)
+        response = Response(body, mimetype="application/json")
+        if encoding:
+            response.headers["Content-Encoding"] = encoding
+    # Weak: the same tag covers the plain and compressed bodies
+    response.set_etag(etag, weak=True)
+    if last_modified is not None:
+        response.last_modified = last_modified
+    # Let browsers keep the body but revalidate it on every request
+    response.headers["Cache-Control"] = "no-cache"
+    response.vary.add("Accept-Encoding")
+    return response
+
+
+ENTRY_COLUMNS = "id, entry_time, exit_time, car_plate, due_payment, payment_status"
+INCIDENT_COLUMNS = (
+    "id, car_plate, incident_type, incident_time, description, resolved, "
+    "resolution_notes, additional_info"
+)
+
+
+# Format data for JSON responses
+def format_entry(row):
+    return {
+        "id": row[0],
+        "entry_time": row[1].isoformat() if row[1] else None,
+        "exit_time": row[2].isoformat() if row[2] else None,
+        "car_plate": row[3],
+        "due_payment": float(row[4]) if row[4] is not None else None,
+        "payment_status": row[5],
+    }
+
+
+def format_incident(row):
+    return {
+        "id": row[0],
+        "car_plate": row[1],
+        "incident_type": row[2],
+        "incident_time": row[3].isoformat(),
+        "description": row[4],
+        "resolved": row[5],
+        "resolution_notes": row[6],
+        "additional_info": row[7],
+    }
 
 
 # Endpoint for vehicle check-ins and check-outs
 @app.route("/api/parking_entries", methods=["GET"])
 def get_parking_entries():
     try:
-        conn = get_db_connection()
-        cur = conn.cursor()
-        cur.execute(
-            """
-            SELECT id, entry_time, exit_time, car_plate, due_payment, payment_status
-            FROM parking_entries
-            ORDER BY entry_time DESC
-        """
-        )
-        rows = cur.fetchall()
-        cur.close()
-        conn.close()
-
-        # Format data for JSON response
-        entries = [
+        payment_status = request.args.get("payment_status")
+        plate = request.args.get("plate")
+        query, params, limit = build_page_query(
+            ENTRY_COLUMNS,
+            "parking_entries",
+            "entry_time",
             {
-                "id": row[0],
-                "entry_time": row[1].isoformat() if row[1] else None,
-                "exit_time": row[2].isoformat() if row[2] else None,
-                "car_plate": row[3],
-                "due_payment": float(row[4]) if row[4] is not None else None,
-                "payment_status": row[5],
-            }
-            for row in rows
-        ]
-        return jsonify(entries)
+                "car_plate": plate.upper() if plate else None,
+                "payment_status": (
+                    parse_bool("payment_status", payment_status)
+                    if payment_status
+                    else None
+                ),
+            },
+        )
+        return page_response(
+            "parking_entries", query, params, limit, time_index=1, format_row=format_entry
+        )
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -57,37 +325,176 @@ def get_parking_entries():
 @app.route("/api/security_incidents", methods=["GET"])
 def get_security_incidents():
     try:
-        conn = get_db_connection()
-        cur = conn.cursor()
-        cur.execute(
-            """
-            SELECT id, car_plate, incident_type, incident_time, description, resolved, resolution_notes, additional_info
-            FROM security_incidents
-            ORDER BY incident_time DESC
-        """
+        resolved = request.args.get("resolved")
+        plate = request.args.get("plate")
+        query, params, limit = build_page_query(
+            INCIDENT_COLUMNS,
+            "security_incidents",
+            "incident_time",
+            {
+                "car_plate": plate.upper() if plate else None,
+                "incident_type": request.args.get("incident_type"),
+                "resolved": parse_bool("resolved", resolved) if resolved else None,
+            },
         )
-        rows = cur.fetchall()
-        cur.close()
-        conn.close()
+        return page_response(
+            "security_incidents",
+            query,
+            params,
+            limit,
+            time_index=3,
+            format_row=format_incident,
+        )
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
 
-        # Format data for JSON response
-        incidents = [
+
+def parse_window(name, default, maximum):
+    value = request.args.get(name)
+    if value is None:
+        return default
+    try:
+        window = int(value)
+    except ValueError:
+        raise ValueError(f"Invalid {name}: {value}")
+    return max(1, min(window, maximum))
+
+
+def format_revenue(bucket, revenue, payments):
+    return {
+        "start": bucket.isoformat(),
+        "revenue": float(revenue),
+        "payments": payments,
+    }
+
+
+# Dashboard figures from the rollups in database/migrations/007_stats_rollups.sql
+# (parking_stats sharded by 009_shard_parking_stats.sql)
+@app.route("/api/stats", methods=["GET"])
+def get_stats():
+    try:
+        hours = parse_window("hours", STATS_HOURS, MAX_STATS_HOURS)
+        days = parse_window("days", STATS_DAYS, MAX_STATS_DAYS)
+        with get_db_connection() as conn:
+            with conn.cursor() as cur:
+                # Sharded counters (migration 009): always exactly one row
+                cur.execute(
+                    """
+                    SELECT COALESCE(SUM(occupancy), 0), COALESCE(SUM(unpaid), 0),
+                           COALESCE(SUM(total_revenue), 0)
+                    FROM parking_stats
+                    """
+                )
+                occupancy, unpaid, total_revenue = cur.fetchone()
+                cur.execute(
+                    """
+                    SELECT hour, revenue, payments FROM revenue_hourly
+                    WHERE hour >= date_trunc('hour', LOCALTIMESTAMP) - %s * INTERVAL '1 hour'
+                      AND payments > 0
+                    ORDER BY hour
+                    """,
+                    (hours - 1,),
+                )
+                hourly = [format_revenue(*row) for row in cur.fetchall()]
+                cur.execute(
+                    """
+                    SELECT day, revenue, payments FROM revenue_daily
+                    WHERE day > CURRENT_DATE - %s AND payments > 0
+                    ORDER BY day
+                    """,
+                    (days,),
+                )
+                daily = [format_revenue(*row) for row in cur.fetchall()]
+                cur.execute(
+                    "SELECT incident_type, total, unresolved FROM incident_counts WHERE total > 0"
+                )
+                by_type = {
+                    incident_type: {"total": total, "unresolved": unresolved}
+                    for incident_type, total, unresolved in cur.fetchall()
+                }
+
+        return jsonify(
             {
-                "id": row[0],
-                "car_plate": row[1],
-                "incident_type": row[2],
-                "incident_time": row[3].isoformat(),
-                "description": row[4],
-                "resolved": row[5],
-                "resolution_notes": row[6],
-                "additional_info": row[7],
+                "occupancy": occupancy,
+                "unpaid": unpaid,
+                "total_revenue": float(total_revenue),
+                "revenue_hourly": hourly,
+                "revenue_daily": daily,
+                "incidents": {
+                    "total": sum(c["total"] for c in by_type.values()),
+                    "unresolved": sum(c["unresolved"] for c in by_type.values()),
+                    "by_type": by_type,
+                },
             }
-            for row in rows
-        ]
-        return jsonify(incidents)
+        )
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 
+# table -> (event name, columns, formatter) for the live feed
+LIVE_TABLES = {
+    "parking_entries": ("parking_entry", ENTRY_COLUMNS, format_entry),
+    "security_incidents": ("security_incident", INCIDENT_COLUMNS, format_incident),
+}
+
+
+def fetch_changed_rows(table, ids):
+    event, columns, format_row = LIVE_TABLES[table]
+    with get_db_connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute(f"SELECT {columns} FROM {table} WHERE id = ANY(%s)", (ids,))
+            return [(event, format_row(row)) for row in cur.fetchall()]
+
+
+change_feed = ChangeFeed(fetch_changed_rows)
+
+
+# Server-sent events: every inserted or changed entry and incident
+@app.route("/api/events", methods=["GET"])
+def stream_events():
+    client = change_feed.subscribe()
+
+    def generate():
+        try:
+            yield "retry: 3000\n\n"
+            while True:
+                try:
+                    event, row = client.get(timeout=EVENT_HEARTBEAT)
+                except queue.Empty:
+                    # Comment line keeps proxies from closing an idle stream
+                    yield ": keep-alive\n\n"
+                    continue
+                yield f"event: {event}\ndata: {dumps(row).decode()}\n\n"
+        finally:
+            change_feed.unsubscribe(client)
+
+    return Response(
+        generate(),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+# Prometheus scrape target: API latencies, plus the gate pipeline metrics when
+# the gates share PROMETHEUS_MULTIPROC_DIR with this process (hardware/metrics.py)
+@app.route("/metrics", methods=["GET"])
+def get_metrics():
+    rendered = metrics.render()
+    if rendered is None:
+        return jsonify({"error": "prometheus_client is not installed"}), 501
+    body, content_type = rendered
+    return Response(body, content_type=content_type)
+
+
 if __name__ == "__main__":
-    app.run(debug=True, host="0.0.0.0", port=5000)
+    # Development server only; production runs gunicorn (see wsgi.py)
+    app.run(
+        debug=os.getenv("FLASK_DEBUG") == "1",
+        host="0.0.0.0",
+        port=5000,
+        threaded=True,
+    )
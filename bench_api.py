@@ -0,0 +1,120 @@
+"""
+Load-test the backend API (requests per second and latency percentiles).
+
+    python bench_api.py http://localhost:5000 --concurrency 32 --duration 20
+
+Run it once against the development server (python backend.py) and once
+against gunicorn (gunicorn -c gunicorn.conf.py wsgi:app) on the same
+database to compare. Each client thread keeps one HTTP/1.1 connection open
+and cycles through the paths, like a dashboard polling the API. Pass
+--conditional to revalidate with If-None-Match, as browsers do.
+"""
+import argparse
+import http.client
+import statistics
+import threading
+import time
+from urllib.parse import urlsplit
+
+DEFAULT_PATHS = [
+    "/api/parking_entries?limit=500",
+    "/api/security_incidents?limit=500",
+    "/api/stats",
+]
+
+
+class Client(threading.Thread):
+    def __init__(self, base, paths, deadline, conditional):
+        super().__init__(daemon=True)
+        self.base = base
+        self.paths = paths
+        self.deadline = deadline
+        self.conditional = conditional
+        self.etags = {}
+        self.latencies = []
+        self.statuses = {}
+        self.errors = 0
+
+    def _connect(self):
+        cls = (
+            http.client.HTTPSConnection
+            if self.base.scheme == "https"
+            else http.client.HTTPConnection
+        )
+        return cls(self.base.netloc, timeout=30)
+
+    def run(self):
+        conn = self._connect()
+        i = 0
+        while time.monotonic() < self.deadline:
+            path = self.paths[i % len(self.paths)]
+            i += 1
+            headers = {"Accept-Encoding": "gzip"}
+            if self.conditional and path in self.etags:
+                headers["If-None-Match"] = self.etags[path]
+            start = time.perf_counter()
+            try:
+                conn.request("GET", path, headers=headers)
+                response = conn.getresponse()
+                response.read()
+            except (OSError, http.client.HTTPException):
+                self.errors += 1
+                conn.close()
+                conn = self._connect()
+                continue
+            self.latencies.append(time.perf_counter() - start)
+            self.statuses[response.status] = self.statuses.get(response.status, 0) + 1
+            etag = response.getheader("ETag")
+            if etag:
+                self.etags[path] = etag
+        conn.close()
+
+
+def percentile(values, p):
+    return values[min(len(values) - 1, int(len(values) * p / 100))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("url", nargs="?", default="http://localhost:5000")
+    parser.add_argument("--path", action="append", help="path to request, repeatable")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--duration", type=float, default=10, help="seconds")
+    parser.add_argument("--conditional", action="store_true")
+    args = parser.parse_args()
+
+    base = urlsplit(args.url)
+    paths = [base.path.rstrip("/") + p for p in (args.path or DEFAULT_PATHS)]
+    deadline = time.monotonic() + args.duration
+    clients = [Client(base, paths, deadline, args.conditional) for _ in range(args.concurrency)]
+    start = time.monotonic()
+    for client in clients:
+        client.start()
+    for client in clients:
+        client.join()
+    elapsed = time.monotonic() - start
+
+    latencies = sorted(l for c in clients for l in c.latencies)
+    errors = sum(c.errors for c in clients)
+    statuses = {}
+    for client in clients:
+        for status, count in client.statuses.items():
+            statuses[status] = statuses.get(status, 0) + count
+    if not latencies:
+        print(f"[BENCH] No successful requests ({errors} errors)")
+        return
+    print(
+        f"[BENCH] {len(latencies)} requests in {elapsed:.1f}s with {args.concurrency} clients "
+        f"-> {len(latencies) / elapsed:.1f} req/s ({errors} errors)"
+    )
+    print(
+        f"[BENCH] latency ms: mean {statistics.mean(latencies) * 1000:.1f}, "
+        f"p50 {percentile(latencies, 50) * 1000:.1f}, "
+        f"p95 {percentile(latencies, 95) * 1000:.1f}, "
+        f"p99 {percentile(latencies, 99) * 1000:.1f}"
+    )
+    print(f"[BENCH] status codes: {dict(sorted(statuses.items()))}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+"""
+Live change feed behind the dashboard's GET /api/events stream.
+
+One listener thread per backend process holds a dedicated connection that
+LISTENs on the parking_events channel (database/migrations/
+006_change_notifications.sql). Notifications arriving within COALESCE
+seconds of each other are fetched in one query per table and fanned out to
+every subscribed client as (event name, row) pairs.
+
+A client whose queue overflows, and every client after the listener had to
+reconnect, gets a "resync" event: it may have missed changes and should
+reload its lists.
+"""
+import json
+import queue
+import select
+import threading
+import time
+
+import psycopg2
+
+from hardware.db_pool import DB_CONFIG
+
+CHANNEL = "parking_events"
+COALESCE = 0.1  # seconds to gather a burst of notifications
+RECONNECT_INTERVAL = 2  # seconds
+CLIENT_QUEUE_SIZE = 1000
+RESYNC = ("resync", None)
+
+
+class ChangeFeed:
+    """`fetch_rows(table, ids)` returns [(event name, row dict)] for changed rows"""
+
+    def __init__(self, fetch_rows):
+        self.fetch_rows = fetch_rows
+        self._clients = set()
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def subscribe(self):
+        client = queue.Queue(maxsize=CLIENT_QUEUE_SIZE)
+        with self._lock:
+            self._clients.add(client)
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name="change-feed", daemon=True
+                )
+                self._thread.start()
+        return client
+
+    def unsubscribe(self, client):
+        with self._lock:
+            self._clients.discard(client)
+
+    def _broadcast(self, events):
+        with self._lock:
+            clients = list(self._clients)
+        for client in clients:
+            try:
+                for event in events:
+                    client.put_nowait(event)
+            except queue.Full:
+                # A stalled client: drop its backlog and make it reload
+                while not client.empty():
+                    try:
+                        client.get_nowait()
+                    except queue.Empty:
+                        break
+                client.put_nowait(RESYNC)
+
+    def _connect(self):
+        conn = psycopg2.connect(**DB_CONFIG)
+        conn.autocommit = True
+        with conn.cursor() as cur:
+            cur.execute(f"LISTEN {CHANNEL}")
+        return conn
+
+    def _drain(self, conn, changed):
+        conn.poll()
+        while conn.notifies:
+            notify = conn.notifies.pop(0)
+            try:
+                payload = json.loads(notify.payload)
+                changed.setdefault(payload["table"], set()).add(int(payload["id"]))
+            except (ValueError, KeyError, TypeError):
+                print(f"[EVENTS] Ignoring malformed notification: {notify.payload}")
+
+    def _run(self):
+        try:
+            self._listen()
+        finally:
+            # Let the next subscriber start a fresh listener
+            with self._lock:
+                self._thread = None
+
+    def _listen(self):
+        conn = None
+        while True:
+            try:
+                if conn is None:
+                    conn = self._connect()
+                    print(f"[EVENTS] Listening on {CHANNEL}")
+                if select.select([conn], [], [], 5) == ([], [], []):
+                    continue
+                changed = {}
+                self._drain(conn, changed)
+                # Gather the rest of a burst (e.g. a batch of incidents)
+                time.sleep(COALESCE)
+                self._drain(conn, changed)
+                events = []
+                for table, ids in changed.items():
+                    events.extend(self.fetch_rows(table, sorted(ids)))
+                if events:
+                    self._broadcast(events)
+            except Exception as e:
+                # Not only psycopg2.Error: a bug in fetch_rows or a bad row
+                # must not end the feed for every dashboard
+                print(f"[EVENTS] Listener failed: {e}; reconnecting")
+                if conn is not None:
+                    try:
+                        conn.close()
+                    except psycopg2.Error:
+                        pass
+                conn = None
+                time.sleep(RECONNECT_INTERVAL)
+                # Changes made while disconnected were never delivered
+                self._broadcast([RESYNC])
@@ -0,0 +1,15 @@
+-- Indexes backing keyset pagination in backend.py.
+-- Pages are ordered by (time column, id) DESC and filtered by plate/status,
+-- so every page is a bounded index range scan instead of a full sort.
+
+CREATE INDEX IF NOT EXISTS idx_parking_entries_entry_time_id
+    ON parking_entries (entry_time DESC, id DESC);
+
+CREATE INDEX IF NOT EXISTS idx_parking_entries_plate_entry_time_id
+    ON parking_entries (car_plate, entry_time DESC, id DESC);
+
+CREATE INDEX IF NOT EXISTS idx_security_incidents_incident_time_id
+    ON security_incidents (incident_time DESC, id DESC);
+
+CREATE INDEX IF NOT EXISTS idx_security_incidents_plate_incident_time_id
+    ON security_incidents (car_plate, incident_time DESC, id DESC);
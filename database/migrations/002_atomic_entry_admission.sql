@@ -0,0 +1,69 @@
+-- Single-round-trip entry admission used by hardware/car_entry.py.
+--
+-- At most one active (not yet exited) entry per plate. Creating this index
+-- fails if duplicates already exist; close the stale rows first:
+--   SELECT car_plate, COUNT(*) FROM parking_entries
+--   WHERE exit_time IS NULL GROUP BY car_plate HAVING COUNT(*) > 1;
+CREATE UNIQUE INDEX IF NOT EXISTS uq_parking_entries_active_plate
+    ON parking_entries (car_plate)
+    WHERE exit_time IS NULL;
+
+-- Admit a vehicle or, if it is already inside, record a double-entry
+-- incident carrying the original entry's details. Returns exactly one row:
+--   admitted = TRUE  -> entry_id is the new entry
+--   admitted = FALSE -> entry_id/active_since/active_paid describe the
+--                       conflicting entry and incident_id the logged incident
+CREATE OR REPLACE FUNCTION admit_vehicle(p_plate TEXT, p_time TIMESTAMP)
+RETURNS TABLE (
+    admitted BOOLEAN,
+    entry_id INTEGER,
+    active_since TIMESTAMP,
+    active_paid BOOLEAN,
+    incident_id INTEGER
+)
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    INSERT INTO parking_entries (entry_time, car_plate, payment_status)
+    VALUES (p_time, p_plate, FALSE)
+    ON CONFLICT (car_plate) WHERE exit_time IS NULL DO NOTHING
+    RETURNING id INTO entry_id;
+
+    IF entry_id IS NOT NULL THEN
+        admitted := TRUE;
+        RETURN NEXT;
+        RETURN;
+    END IF;
+
+    -- Runs in a new snapshot, so it also sees an entry committed by another
+    -- lane while our INSERT was waiting on the unique index.
+    SELECT pe.id, pe.entry_time, pe.payment_status
+    INTO entry_id, active_since, active_paid
+    FROM parking_entries pe
+    WHERE pe.car_plate = p_plate AND pe.exit_time IS NULL;
+
+    INSERT INTO security_incidents
+        (car_plate, incident_type, incident_time, description, additional_info)
+    VALUES (
+        p_plate,
+        'DOUBLE_ENTRY_ATTEMPT',
+        p_time,
+        format('Vehicle %s attempted to enter while already inside parking', p_plate),
+        -- The conflicting entry may have exited since the INSERT; the row
+        -- values are then NULL, which || would turn into a NULL text
+        format(
+            'Original entry time: %s, Payment status: %s',
+            COALESCE(active_since::TEXT, 'unknown'),
+            CASE
+                WHEN active_paid THEN 'Paid'
+                WHEN NOT active_paid THEN 'Unpaid'
+                ELSE 'Unknown'
+            END
+        )
+    )
+    RETURNING id INTO incident_id;
+
+    admitted := FALSE;
+    RETURN NEXT;
+END;
+$$;
@@ -0,0 +1,6 @@
+-- Supports the single exit-state query in hardware/car_exit.py:
+--   * unpaid active lookup:  car_plate = ?, exit_time IS NULL, payment_status = FALSE
+--   * latest paid exit:      car_plate = ?, MAX(exit_time) WHERE payment_status
+--   * any entry at all:      car_plate = ? (leading column)
+CREATE INDEX IF NOT EXISTS idx_parking_entries_plate_exit_status_entry
+    ON parking_entries (car_plate, exit_time, payment_status, entry_time);
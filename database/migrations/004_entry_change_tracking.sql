@@ -0,0 +1,26 @@
+-- Change tracking for the gates' local state mirrors (hardware/local_state.py).
+--
+-- Every insert or update of a parking entry stamps updated_at, and the gates
+-- poll for rows changed since their last sync. now() is the transaction start
+-- time, so a long transaction can commit rows stamped in the past; the gates
+-- re-read a trailing overlap window to pick those up.
+ALTER TABLE parking_entries
+    ADD COLUMN IF NOT EXISTS updated_at TIMESTAMP NOT NULL DEFAULT now();
+
+CREATE OR REPLACE FUNCTION touch_updated_at()
+RETURNS trigger
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    NEW.updated_at := now();
+    RETURN NEW;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS trg_parking_entries_updated_at ON parking_entries;
+CREATE TRIGGER trg_parking_entries_updated_at
+    BEFORE UPDATE ON parking_entries
+    FOR EACH ROW EXECUTE FUNCTION touch_updated_at();
+
+CREATE INDEX IF NOT EXISTS idx_parking_entries_updated_at
+    ON parking_entries (updated_at, id);
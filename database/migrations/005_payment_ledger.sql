@@ -0,0 +1,158 @@
+-- Payment ledger used by hardware/process_payment.py.
+--
+-- Every card tap that can pay goes through reserve_payment(), which locks the
+-- plate's unpaid entry with FOR UPDATE SKIP LOCKED (a concurrent tap for the
+-- same entry gets BUSY instead of waiting), computes the fee and records a
+-- RESERVED payment. The terminal then writes the card, and
+-- complete_payment() marks the payment and the entry paid. Both steps are
+-- short transactions; nothing is held while the card is being written.
+--
+-- Retries are safe:
+--   * the same tap again (same entry, same card balance) reuses its payment
+--     through the idempotency key instead of creating a second charge
+--   * a tap whose card balance already equals balance - amount of the
+--     entry's last unfinished payment means that charge reached the card
+--     (e.g. DONE was lost); it is completed without charging again
+CREATE TABLE IF NOT EXISTS payments (
+    id SERIAL PRIMARY KEY,
+    entry_id INTEGER NOT NULL REFERENCES parking_entries (id),
+    car_plate TEXT NOT NULL,
+    idempotency_key TEXT NOT NULL UNIQUE,
+    terminal TEXT,
+    amount INTEGER NOT NULL,
+    card_balance INTEGER NOT NULL,
+    status TEXT NOT NULL DEFAULT 'RESERVED'
+        CHECK (status IN ('RESERVED', 'COMPLETED', 'FAILED', 'EXPIRED')),
+    created_at TIMESTAMP NOT NULL,
+    completed_at TIMESTAMP
+);
+
+-- At most one open reservation per entry
+CREATE UNIQUE INDEX IF NOT EXISTS uq_payments_reserved_entry
+    ON payments (entry_id)
+    WHERE status = 'RESERVED';
+
+CREATE INDEX IF NOT EXISTS idx_payments_entry_created
+    ON payments (entry_id, created_at DESC);
+
+-- outcome: RESERVED, ALREADY_CHARGED, INSUFFICIENT, BUSY or NOT_FOUND
+CREATE OR REPLACE FUNCTION reserve_payment(
+    p_plate TEXT,
+    p_balance INTEGER,
+    p_terminal TEXT,
+    p_time TIMESTAMP,
+    p_rate_per_hour INTEGER DEFAULT 500,
+    p_reservation_ttl INTERVAL DEFAULT INTERVAL '60 seconds'
+)
+RETURNS TABLE (outcome TEXT, payment_id INTEGER, entry_id INTEGER, amount INTEGER)
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    v_entry_time TIMESTAMP;
+    v_last payments%ROWTYPE;
+BEGIN
+    SELECT pe.id INTO entry_id
+    FROM parking_entries pe
+    WHERE pe.car_plate = p_plate AND pe.payment_status = FALSE
+    ORDER BY pe.entry_time DESC
+    LIMIT 1;
+
+    IF entry_id IS NULL THEN
+        outcome := 'NOT_FOUND';
+        RETURN NEXT;
+        RETURN;
+    END IF;
+
+    SELECT pe.entry_time INTO v_entry_time
+    FROM parking_entries pe
+    WHERE pe.id = entry_id AND pe.payment_status = FALSE
+    FOR UPDATE SKIP LOCKED;
+
+    IF NOT FOUND THEN
+        -- Another terminal holds the row right now (or just finished paying)
+        outcome := 'BUSY';
+        RETURN NEXT;
+        RETURN;
+    END IF;
+
+    SELECT * INTO v_last
+    FROM payments p
+    WHERE p.entry_id = reserve_payment.entry_id AND p.status <> 'COMPLETED'
+    ORDER BY p.created_at DESC
+    LIMIT 1;
+
+    IF FOUND THEN
+        IF p_balance = v_last.card_balance - v_last.amount THEN
+            PERFORM complete_payment(v_last.id, p_time);
+            outcome := 'ALREADY_CHARGED';
+            payment_id := v_last.id;
+            amount := v_last.amount;
+            RETURN NEXT;
+            RETURN;
+        END IF;
+
+        IF v_last.status = 'RESERVED' THEN
+            IF v_last.card_balance <> p_balance
+                AND v_last.created_at > p_time - p_reservation_ttl THEN
+                outcome := 'BUSY';
+                RETURN NEXT;
+                RETURN;
+            END IF;
+            IF v_last.card_balance <> p_balance THEN
+                UPDATE payments SET status = 'EXPIRED' WHERE id = v_last.id;
+            END IF;
+        END IF;
+    END IF;
+
+    amount := CEIL(EXTRACT(EPOCH FROM (p_time - v_entry_time)) / 3600)::INTEGER
+        * p_rate_per_hour;
+
+    IF p_balance < amount THEN
+        outcome := 'INSUFFICIENT';
+        RETURN NEXT;
+        RETURN;
+    END IF;
+
+    INSERT INTO payments AS p
+        (entry_id, car_plate, idempotency_key, terminal, amount, card_balance, status, created_at)
+    VALUES (
+        entry_id, p_plate, entry_id || ':' || p_balance, p_terminal, amount, p_balance,
+        'RESERVED', p_time
+    )
+    ON CONFLICT (idempotency_key) DO UPDATE
+        SET status = 'RESERVED',
+            terminal = EXCLUDED.terminal,
+            amount = EXCLUDED.amount,
+            created_at = EXCLUDED.created_at
+    RETURNING p.id INTO payment_id;
+
+    outcome := 'RESERVED';
+    RETURN NEXT;
+END;
+$$;
+
+-- Mark a reserved payment and its entry paid. Safe to call twice.
+CREATE OR REPLACE FUNCTION complete_payment(p_payment_id INTEGER, p_time TIMESTAMP)
+RETURNS BOOLEAN
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    v_payment payments%ROWTYPE;
+BEGIN
+    UPDATE payments
+    SET status = 'COMPLETED', completed_at = p_time
+    WHERE id = p_payment_id AND status <> 'COMPLETED'
+    RETURNING * INTO v_payment;
+
+    IF NOT FOUND THEN
+        RETURN FALSE;
+    END IF;
+
+    UPDATE parking_entries
+    SET exit_time = v_payment.created_at,
+        due_payment = v_payment.amount,
+        payment_status = TRUE
+    WHERE id = v_payment.entry_id AND payment_status = FALSE;
+    RETURN TRUE;
+END;
+$$;
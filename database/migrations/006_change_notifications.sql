@@ -0,0 +1,28 @@
+-- Change notifications for the dashboard's live feed (GET /api/events).
+--
+-- Every insert or update of a parking entry or security incident sends
+-- {"table": ..., "id": ...} on the parking_events channel once the
+-- transaction commits. The backend fetches the changed rows itself, so the
+-- payload stays far below the NOTIFY size limit.
+CREATE OR REPLACE FUNCTION notify_parking_event()
+RETURNS trigger
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    PERFORM pg_notify(
+        'parking_events',
+        json_build_object('table', TG_TABLE_NAME, 'id', NEW.id)::text
+    );
+    RETURN NULL;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS trg_parking_entries_notify ON parking_entries;
+CREATE TRIGGER trg_parking_entries_notify
+    AFTER INSERT OR UPDATE ON parking_entries
+    FOR EACH ROW EXECUTE FUNCTION notify_parking_event();
+
+DROP TRIGGER IF EXISTS trg_security_incidents_notify ON security_incidents;
+CREATE TRIGGER trg_security_incidents_notify
+    AFTER INSERT OR UPDATE ON security_incidents
+    FOR EACH ROW EXECUTE FUNCTION notify_parking_event();
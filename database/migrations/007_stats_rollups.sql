@@ -0,0 +1,165 @@
+-- Rollups behind GET /api/stats.
+--
+-- Triggers keep the dashboard's figures up to date as rows change, so reading
+-- them costs the same no matter how much history the tables hold:
+--
+--   parking_stats     one row: vehicles inside, unpaid entries, total revenue
+--   revenue_hourly    paid revenue per hour of exit (falls back to entry time)
+--   revenue_daily     the same per day
+--   incident_counts   incidents and unresolved incidents per incident_type
+--
+-- Each trigger subtracts the old row's contribution and adds the new one's,
+-- so updates (a payment, a resolved incident) and deletes are counted
+-- correctly. The counters live in the writing transaction: a rollback undoes
+-- them together with the row.
+CREATE TABLE IF NOT EXISTS parking_stats (
+    id BOOLEAN PRIMARY KEY DEFAULT TRUE CHECK (id),
+    occupancy INTEGER NOT NULL DEFAULT 0,
+    unpaid INTEGER NOT NULL DEFAULT 0,
+    total_revenue NUMERIC NOT NULL DEFAULT 0
+);
+
+CREATE TABLE IF NOT EXISTS revenue_hourly (
+    hour TIMESTAMP PRIMARY KEY,
+    revenue NUMERIC NOT NULL DEFAULT 0,
+    payments INTEGER NOT NULL DEFAULT 0
+);
+
+CREATE TABLE IF NOT EXISTS revenue_daily (
+    day DATE PRIMARY KEY,
+    revenue NUMERIC NOT NULL DEFAULT 0,
+    payments INTEGER NOT NULL DEFAULT 0
+);
+
+CREATE TABLE IF NOT EXISTS incident_counts (
+    incident_type TEXT PRIMARY KEY,
+    total INTEGER NOT NULL DEFAULT 0,
+    unresolved INTEGER NOT NULL DEFAULT 0
+);
+
+-- Add (p_sign = 1) or remove (p_sign = -1) one entry's contribution
+CREATE OR REPLACE FUNCTION apply_entry_stats(p_entry parking_entries, p_sign INTEGER)
+RETURNS VOID
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    v_paid_at TIMESTAMP;
+BEGIN
+    UPDATE parking_stats
+    SET occupancy = occupancy + CASE WHEN p_entry.exit_time IS NULL THEN p_sign ELSE 0 END,
+        unpaid = unpaid + CASE WHEN p_entry.payment_status THEN 0 ELSE p_sign END,
+        total_revenue = total_revenue + CASE
+            WHEN p_entry.payment_status THEN p_sign * COALESCE(p_entry.due_payment, 0)
+            ELSE 0
+        END;
+
+    IF p_entry.payment_status IS NOT TRUE OR p_entry.due_payment IS NULL THEN
+        RETURN;
+    END IF;
+
+    v_paid_at := COALESCE(p_entry.exit_time, p_entry.entry_time);
+
+    INSERT INTO revenue_hourly AS r (hour, revenue, payments)
+    VALUES (date_trunc('hour', v_paid_at), p_sign * p_entry.due_payment, p_sign)
+    ON CONFLICT (hour) DO UPDATE
+        SET revenue = r.revenue + EXCLUDED.revenue,
+            payments = r.payments + EXCLUDED.payments;
+
+    INSERT INTO revenue_daily AS r (day, revenue, payments)
+    VALUES (v_paid_at::DATE, p_sign * p_entry.due_payment, p_sign)
+    ON CONFLICT (day) DO UPDATE
+        SET revenue = r.revenue + EXCLUDED.revenue,
+            payments = r.payments + EXCLUDED.payments;
+END;
+$$;
+
+CREATE OR REPLACE FUNCTION apply_incident_stats(p_incident security_incidents, p_sign INTEGER)
+RETURNS VOID
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    INSERT INTO incident_counts AS c (incident_type, total, unresolved)
+    VALUES (
+        p_incident.incident_type,
+        p_sign,
+        CASE WHEN p_incident.resolved THEN 0 ELSE p_sign END
+    )
+    ON CONFLICT (incident_type) DO UPDATE
+        SET total = c.total + EXCLUDED.total,
+            unresolved = c.unresolved + EXCLUDED.unresolved;
+END;
+$$;
+
+CREATE OR REPLACE FUNCTION update_entry_stats()
+RETURNS trigger
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        PERFORM apply_entry_stats(OLD, -1);
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        PERFORM apply_entry_stats(NEW, 1);
+    END IF;
+    RETURN NULL;
+END;
+$$;
+
+CREATE OR REPLACE FUNCTION update_incident_stats()
+RETURNS trigger
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        PERFORM apply_incident_stats(OLD, -1);
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        PERFORM apply_incident_stats(NEW, 1);
+    END IF;
+    RETURN NULL;
+END;
+$$;
+
+-- Build the rollups from the existing rows and attach the triggers in one
+-- transaction, with writers locked out so nothing is counted twice or missed
+BEGIN;
+
+LOCK TABLE parking_entries, security_incidents IN SHARE ROW EXCLUSIVE MODE;
+
+TRUNCATE parking_stats, revenue_hourly, revenue_daily, incident_counts;
+
+INSERT INTO parking_stats (occupancy, unpaid, total_revenue)
+SELECT
+    COUNT(*) FILTER (WHERE exit_time IS NULL),
+    COUNT(*) FILTER (WHERE payment_status IS NOT TRUE),
+    COALESCE(SUM(due_payment) FILTER (WHERE payment_status), 0)
+FROM parking_entries;
+
+INSERT INTO revenue_hourly (hour, revenue, payments)
+SELECT date_trunc('hour', COALESCE(exit_time, entry_time)), SUM(due_payment), COUNT(*)
+FROM parking_entries
+WHERE payment_status AND due_payment IS NOT NULL
+GROUP BY 1;
+
+INSERT INTO revenue_daily (day, revenue, payments)
+SELECT COALESCE(exit_time, entry_time)::DATE, SUM(due_payment), COUNT(*)
+FROM parking_entries
+WHERE payment_status AND due_payment IS NOT NULL
+GROUP BY 1;
+
+INSERT INTO incident_counts (incident_type, total, unresolved)
+SELECT incident_type, COUNT(*), COUNT(*) FILTER (WHERE resolved IS NOT TRUE)
+FROM security_incidents
+GROUP BY incident_type;
+
+DROP TRIGGER IF EXISTS trg_parking_entries_stats ON parking_entries;
+CREATE TRIGGER trg_parking_entries_stats
+    AFTER INSERT OR UPDATE OR DELETE ON parking_entries
+    FOR EACH ROW EXECUTE FUNCTION update_entry_stats();
+
+DROP TRIGGER IF EXISTS trg_security_incidents_stats ON security_incidents;
+CREATE TRIGGER trg_security_incidents_stats
+    AFTER INSERT OR UPDATE OR DELETE ON security_incidents
+    FOR EACH ROW EXECUTE FUNCTION update_incident_stats();
+
+COMMIT;
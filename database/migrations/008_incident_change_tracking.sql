@@ -0,0 +1,15 @@
+-- Change tracking for security incidents, as 004 does for parking entries.
+--
+-- The backend derives the ETag/Last-Modified of GET /api/security_incidents
+-- from max(id) and max(updated_at), so resolving an incident has to move
+-- updated_at as well. Uses touch_updated_at() from 004.
+ALTER TABLE security_incidents
+    ADD COLUMN IF NOT EXISTS updated_at TIMESTAMP NOT NULL DEFAULT now();
+
+DROP TRIGGER IF EXISTS trg_security_incidents_updated_at ON security_incidents;
+CREATE TRIGGER trg_security_incidents_updated_at
+    BEFORE UPDATE ON security_incidents
+    FOR EACH ROW EXECUTE FUNCTION touch_updated_at();
+
+CREATE INDEX IF NOT EXISTS idx_security_incidents_updated_at
+    ON security_incidents (updated_at);
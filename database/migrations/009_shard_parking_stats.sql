@@ -0,0 +1,80 @@
+-- Spread the parking_stats counters from 007 over 16 rows.
+--
+-- With a single row, every admission, payment and exit updated the same
+-- tuple, so concurrent writers queued on its row lock until the previous
+-- transaction committed. Each entry now adds to the shard picked by its id,
+-- so consecutive entries land on different rows. GET /api/stats sums the
+-- shards.
+
+-- Swapped in one transaction with writers locked out, as in 007, so no
+-- trigger ever sees the old table with the new function or the reverse
+BEGIN;
+
+LOCK TABLE parking_entries IN SHARE ROW EXCLUSIVE MODE;
+
+CREATE OR REPLACE FUNCTION parking_stats_shard(p_entry_id BIGINT)
+RETURNS SMALLINT
+LANGUAGE sql
+IMMUTABLE
+AS $$
+    SELECT (p_entry_id % 16)::SMALLINT
+$$;
+
+-- Same as 007, but only touches the entry's shard
+CREATE OR REPLACE FUNCTION apply_entry_stats(p_entry parking_entries, p_sign INTEGER)
+RETURNS VOID
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    v_paid_at TIMESTAMP;
+BEGIN
+    UPDATE parking_stats
+    SET occupancy = occupancy + CASE WHEN p_entry.exit_time IS NULL THEN p_sign ELSE 0 END,
+        unpaid = unpaid + CASE WHEN p_entry.payment_status THEN 0 ELSE p_sign END,
+        total_revenue = total_revenue + CASE
+            WHEN p_entry.payment_status THEN p_sign * COALESCE(p_entry.due_payment, 0)
+            ELSE 0
+        END
+    WHERE shard = parking_stats_shard(p_entry.id);
+
+    IF p_entry.payment_status IS NOT TRUE OR p_entry.due_payment IS NULL THEN
+        RETURN;
+    END IF;
+
+    v_paid_at := COALESCE(p_entry.exit_time, p_entry.entry_time);
+
+    INSERT INTO revenue_hourly AS r (hour, revenue, payments)
+    VALUES (date_trunc('hour', v_paid_at), p_sign * p_entry.due_payment, p_sign)
+    ON CONFLICT (hour) DO UPDATE
+        SET revenue = r.revenue + EXCLUDED.revenue,
+            payments = r.payments + EXCLUDED.payments;
+
+    INSERT INTO revenue_daily AS r (day, revenue, payments)
+    VALUES (v_paid_at::DATE, p_sign * p_entry.due_payment, p_sign)
+    ON CONFLICT (day) DO UPDATE
+        SET revenue = r.revenue + EXCLUDED.revenue,
+            payments = r.payments + EXCLUDED.payments;
+END;
+$$;
+
+DROP TABLE IF EXISTS parking_stats;
+
+CREATE TABLE parking_stats (
+    shard SMALLINT PRIMARY KEY CHECK (shard BETWEEN 0 AND 15),
+    occupancy INTEGER NOT NULL DEFAULT 0,
+    unpaid INTEGER NOT NULL DEFAULT 0,
+    total_revenue NUMERIC NOT NULL DEFAULT 0
+);
+
+-- Every shard must exist: apply_entry_stats only updates
+INSERT INTO parking_stats (shard, occupancy, unpaid, total_revenue)
+SELECT
+    s.shard,
+    COUNT(e.id) FILTER (WHERE e.exit_time IS NULL),
+    COUNT(e.id) FILTER (WHERE e.payment_status IS NOT TRUE),
+    COALESCE(SUM(e.due_payment) FILTER (WHERE e.payment_status), 0)
+FROM generate_series(0, 15) AS s (shard)
+LEFT JOIN parking_entries e ON parking_stats_shard(e.id) = s.shard
+GROUP BY s.shard;
+
+COMMIT;
@@ -0,0 +1,59 @@
+"""
+Gunicorn settings for serving backend.py in production (see wsgi.py).
+
+    gunicorn -c gunicorn.conf.py wsgi:app
+
+Every worker is a separate process with its own DB connection pool
+(hardware/db_pool.py, opened lazily on the first request) and its own
+change-feed listener. Threaded workers are required: each open
+/api/events stream holds a thread for as long as the dashboard is
+connected, so size API_THREADS for the expected number of dashboards plus
+headroom for the list endpoints.
+
+    kill -HUP <master pid>    graceful reload: new workers start, old ones
+                              finish their requests within graceful_timeout
+    kill -TERM <master pid>   graceful shutdown
+
+Environment: API_BIND (default 0.0.0.0:5000), API_WORKERS (default
+2 x CPUs + 1), API_THREADS (default 8), API_TIMEOUT (default 30 s),
+DB_STATEMENT_TIMEOUT (default 10000 ms for the API).
+"""
+import multiprocessing
+import os
+
+bind = os.getenv("API_BIND", "0.0.0.0:5000")
+workers = int(os.getenv("API_WORKERS", multiprocessing.cpu_count() * 2 + 1))
+worker_class = "gthread"
+threads = int(os.getenv("API_THREADS", "8"))
+
+# A worker that stops responding for this long is killed and replaced. The
+# gthread heartbeat runs beside the requests, so a long-lived SSE stream
+# does not count against it.
+timeout = int(os.getenv("API_TIMEOUT", "30"))
+graceful_timeout = 30
+keepalive = 5
+
+# Recycle workers now and then so slow leaks cannot build up; the jitter
+# keeps them from all restarting at once
+max_requests = 10000
+max_requests_jitter = 1000
+
+# One pooled connection per thread, so no request waits on the pool; slow
+# queries are cancelled by PostgreSQL instead of pinning a thread
+os.environ.setdefault("DB_POOL_MAX", str(threads))
+os.environ.setdefault("DB_STATEMENT_TIMEOUT", "10000")
+
+accesslog = "-"
+errorlog = "-"
+
+
+def worker_exit(server, worker):
+    from hardware.db_pool import close_pool
+
+    close_pool()
+
+
+def child_exit(server, worker):
+    from hardware.metrics import mark_process_dead
+
+    mark_process_dead(worker.pid)
@@ -1,320 +1,267 @@
-import platform
-import cv2
-from ultralytics import YOLO
-import pytesseract
+import os
 import time
-import serial
-import serial.tools.list_ports
-from collections import Counter
+import cv2
 import psycopg2
 from datetime import datetime, timedelta
 from psycopg2.extras import DictCursor
-
-# Load YOLOv8 model
-model = YOLO("../model_dev/runs/detect/train/weights/best.pt")
+from db_pool import get_db_connection, init_pool
+from decision_cache import recent_decisions
+from incident_writer import incidents
+from local_state import OFFLINE_ERRORS, local_state
+from metrics import db_query_seconds, decisions, stage, start_server
+from frame_pipeline import FramePipeline
+from gate_controller import GateController
+from gate_runtime import open_windows, parse_gate_args, run_pipeline
+from motion_gate import MotionGate, parse_roi
+from plate_recognition import PlateRecognizer
+from plate_tracker import PlateTracker
+from serial_transport import SerialTransport
 
 # Configurations
-DB_CONFIG = {
-    "dbname": "parking_system",
-    "user": "jodos",
-    "password": "jodos",
-    "host": "localhost",
-    "port": "5432",
-}
 MAX_DISTANCE = 50  # cm
 MIN_DISTANCE = 0  # cm
 EXIT_TIME_WINDOW = 5  # minutes
+# Short, so a driver who has just paid is not refused from memory for long
+EXIT_DECISION_TTL = float(os.getenv("EXIT_DECISION_TTL", 15))  # seconds
+
+
+# Everything the exit decision needs, in one round trip
+EXIT_STATE_QUERY = """
+    SELECT
+        EXISTS (
+            SELECT 1 FROM parking_entries WHERE car_plate = %(plate)s
+        ) AS has_entry,
+        (
+            SELECT id
+            FROM parking_entries
+            WHERE car_plate = %(plate)s
+            AND exit_time IS NULL
+            AND payment_status = FALSE
+            ORDER BY entry_time DESC LIMIT 1
+        ) AS unpaid_entry_id,
+        (
+            SELECT MAX(exit_time)
+            FROM parking_entries
+            WHERE car_plate = %(plate)s
+            AND payment_status = TRUE
+            AND exit_time IS NOT NULL
+        ) AS last_paid_exit
+"""
+
+
+def decide_exit(state, now):
+    """Compute the exit decision from the row returned by EXIT_STATE_QUERY"""
+    if not state["has_entry"]:
+        return "NO_ENTRY"
+    if state["unpaid_entry_id"] is not None:
+        return "UNAUTHORIZED"
+    last_paid_exit = state["last_paid_exit"]
+    if last_paid_exit and last_paid_exit > now - timedelta(minutes=EXIT_TIME_WINDOW):
+        return "GRANTED"
+    return "DENIED"
+
+
+def fetch_exit_state(plate_number):
+    """The EXIT_STATE_QUERY row from PostgreSQL"""
+    with db_query_seconds.labels(query="exit_state").time():
+        with get_db_connection() as conn:
+            with conn.cursor(cursor_factory=DictCursor) as cur:
+                cur.execute(EXIT_STATE_QUERY, {"plate": plate_number})
+                return cur.fetchone()
+
+
+def exit_decision(plate_number, now):
+    """Decide from the local mirror when it is fresh, else from PostgreSQL, else the mirror while offline"""
+    local = local_state.exit_state(plate_number)
+    if local is not None and local_state.fresh:
+        decision = decide_exit(local, now)
+        # Anything but GRANTED may hide a payment the mirror has not seen yet
+        if decision == "GRANTED":
+            return decision
+    try:
+        return decide_exit(fetch_exit_state(plate_number), now)
+    except OFFLINE_ERRORS as e:
+        if local is None:
+            print(f"[DATABASE ERROR] {e}")
+            return "ERROR"
+        print(f"[OFFLINE] Deciding exit for {plate_number} from local state: {e}")
+        return decide_exit(local, now)
+    except psycopg2.Error as e:
+        # Not an outage (e.g. schema mismatch): never decide from the mirror
+        print(f"[DATABASE ERROR] Exit decision failed: {e}")
+        return "ERROR"
 
 
-def get_db_connection():
-    return psycopg2.connect(**DB_CONFIG)
-
-
-# ===== Auto-detect Arduino Serial Port =====
-def detect_arduino_port():
-    for port in serial.tools.list_ports.comports():
-        dev = port.device
-        if platform.system() == "Linux" and "ttyACM" in dev:
-            return dev
-        if platform.system() == "Darwin" and ("usbmodem" in dev or "usbserial" in dev):
-            return dev
-        if platform.system() == "Windows" and "COM" in dev:
-            return dev
-    return None
+def handle_exit(plate_number, gate=None):
+    now = datetime.now()
+    decision = exit_decision(plate_number, now)
+
+    if decision == "NO_ENTRY":
+        # Log security incident for exit attempt without entry
+        incidents.log(
+            plate_number,
+            "NO_ENTRY_EXIT_ATTEMPT",
+            f"Vehicle {plate_number} attempted to exit without any entry record",
+            incident_time=now,
+        )
+        print(
+            f"[SECURITY ALERT] Exit attempt without entry record: {plate_number}"
+        )
+
+        # Trigger more aggressive alarm pattern
+        if gate:
+            gate.alarm("NO_ENTRY")
+
+    elif decision == "UNAUTHORIZED":
+        # Log unauthorized exit attempt
+        incidents.log(
+            plate_number,
+            "UNAUTHORIZED_EXIT",
+            f"Attempted exit without payment for plate {plate_number}",
+            incident_time=now,
+        )
+        print(
+            f"[SECURITY ALERT] Unauthorized exit attempt by {plate_number}"
+        )
+
+        # Trigger alarm pattern
+        if gate:
+            gate.alarm("UNAUTHORIZED")
+
+    elif decision == "GRANTED":
+        print(f"[ACCESS GRANTED] Latest paid exit found for {plate_number}")
+
+    elif decision == "DENIED":
+        print(
+            f"[ACCESS DENIED] No recent paid exit record for {plate_number}"
+        )
+        if gate:
+            gate.alarm("DENIED")
+
+    return decision
+
+
+class ExitLane:
+    """Exit decisions for one lane: tracks plates per vehicle and decides once a track is confirmed"""
+
+    def __init__(self, gate, arduino, motion):
+        self.gate = gate
+        self.arduino = arduino
+        self.motion = motion
+        self.tracker = PlateTracker()
+
+    def should_infer(self, image):
+        # Latest reading pushed by the sensor, default to safe value
+        distance = self.arduino.distance() if self.arduino else None
+        distance = distance or (MAX_DISTANCE - 1)
+        if not MIN_DISTANCE <= distance <= MAX_DISTANCE:
+            return False
+        # Only spend YOLO on frames where the lane changed or a car just stopped,
+        # or while a stopped car's plate is still unread
+        moving = self.motion.should_infer(image)
+        return moving or self.tracker.pending(time.monotonic())
+
+    def process(self, recognizer, frame, detections):
+        """OCR the frame's unconfirmed tracks and decide confirmed plates; returns the reads"""
+        reads, plates = self.tracker.read(
+            recognizer, frame.image, detections, frame.timestamp
+        )
+        for read in reads:
+            if read.plate:
+                print(f"[VALID] Plate Detected: {read.plate}")
+        for plate in plates:
+            self.handle_decision(plate)
+        return reads
+
+    def handle_decision(self, most_common):
+        cached = recent_decisions.get(("exit", most_common))
+        if cached:
+            exit_status, age = cached
+            print(f"[COOLDOWN] {most_common}: {exit_status} {age:.0f}s ago, not re-checking")
+            if exit_status == "GRANTED":
+                self.gate.open_gate()
+            return
+
+        with stage("decision"):
+            exit_status = handle_exit(most_common, self.gate)
+        decisions.labels(gate="exit", outcome=exit_status).inc()
+        if exit_status != "ERROR":
+            recent_decisions.put(("exit", most_common), exit_status, ttl=EXIT_DECISION_TTL)
+
+        if exit_status == "GRANTED":
+            print(f"[ACCESS GRANTED] Exit recorded for {most_common}")
+            self.gate.open_gate()
+            # The car is leaving; a later entry is a new visit
+            recent_decisions.discard(("entry", most_common))
+        elif exit_status == "NO_ENTRY":
+            print(f"[SECURITY ALERT] No entry record found for {most_common}")
+            # Alarm is already handled in handle_exit function
+        elif exit_status == "UNAUTHORIZED":
+            print(f"[SECURITY ALERT] Unauthorized exit attempt by {most_common}")
+            # Alarm is already handled in handle_exit function
+        else:
+            print(f"[ACCESS DENIED] Exit not allowed for {most_common}")
+            # Warning beep is already handled in handle_exit function
 
 
-# Read distance from Arduino (returns float or None)
-def read_distance(arduino):
-    if not arduino or arduino.in_waiting == 0:
-        return None
-    try:
-        val = arduino.readline().decode("utf-8").strip()
-        return float(val)
-    except (UnicodeDecodeError, ValueError):
-        return None
+def main():
+    args = parse_gate_args("Vehicle exit gate")
 
+    # Load YOLOv8 model and OCR engine
+    recognizer = PlateRecognizer(keep_images=not args.headless)
 
-def handle_exit(plate_number, arduino=None):
+    # Warm up the connection pool so the first car does not pay for the handshake
     try:
-        with get_db_connection() as conn:
-            with conn.cursor(cursor_factory=DictCursor) as cur:
-                # First, check if there's any entry record at all for this plate
-                cur.execute(
-                    """
-                    SELECT COUNT(*)
-                    FROM parking_entries
-                    WHERE car_plate = %s
-                """,
-                    (plate_number,),
-                )
-
-                has_any_entry = cur.fetchone()[0] > 0
-
-                if not has_any_entry:
-                    # Log security incident for exit attempt without entry
-                    cur.execute(
-                        """
-                        INSERT INTO security_incidents 
-                        (car_plate, incident_type, incident_time, description)
-                        VALUES (%s, 'NO_ENTRY_EXIT_ATTEMPT', %s, %s)
-                    """,
-                        (
-                            plate_number,
-                            datetime.now(),
-                            f"Vehicle {plate_number} attempted to exit without any entry record",
-                        ),
-                    )
-                    conn.commit()
-                    print(
-                        f"[SECURITY ALERT] Exit attempt without entry record: {plate_number}"
-                    )
-
-                    # Trigger more aggressive alarm pattern
-                    if arduino:
-                        print("[ALARM] Triggering security breach alarm")
-                        for _ in range(5):  # Five alarm bursts (longer pattern)
-                            arduino.write(b"1")  # Open gate (triggers buzzer)
-                            time.sleep(0.7)  # Longer beep
-                            arduino.write(b"0")  # Close gate (stops buzzer)
-                            time.sleep(0.2)  # Short pause
-
-                    return "NO_ENTRY"
-
-                # Rest of the existing checks for unpaid and valid exits...
-                # Check if there's an unpaid entry
-                cur.execute(
-                    """
-                    SELECT id
-                    FROM parking_entries
-                    WHERE car_plate = %s 
-                    AND payment_status = FALSE
-                    AND exit_time IS NULL
-                    ORDER BY entry_time DESC LIMIT 1
-                """,
-                    (plate_number,),
-                )
-
-                unpaid_entry = cur.fetchone()
-
-                if unpaid_entry:
-                    # Log unauthorized exit attempt
-                    cur.execute(
-                        """
-                        INSERT INTO security_incidents 
-                        (car_plate, incident_type, incident_time, description)
-                        VALUES (%s, 'UNAUTHORIZED_EXIT', %s, %s)
-                    """,
-                        (
-                            plate_number,
-                            datetime.now(),
-                            f"Attempted exit without payment for plate {plate_number}",
-                        ),
-                    )
-                    conn.commit()
-                    print(
-                        f"[SECURITY ALERT] Unauthorized exit attempt by {plate_number}"
-                    )
-
-                    # Trigger alarm pattern
-                    if arduino:
-                        print("[ALARM] Triggering security alarm")
-                        for _ in range(3):  # Three alarm bursts
-                            arduino.write(b"1")
-                            time.sleep(0.5)
-                            arduino.write(b"0")
-                            time.sleep(0.3)
-
-                    return "UNAUTHORIZED"
-
-                # Check for valid exit
-                cur.execute(
-                    """
-                    SELECT *
-                    FROM parking_entries
-                    WHERE car_plate = %s 
-                    AND payment_status = TRUE 
-                    AND exit_time IS NOT NULL
-                    AND exit_time > %s
-                    ORDER BY exit_time DESC LIMIT 1
-                """,
-                    (
-                        plate_number,
-                        datetime.now() - timedelta(minutes=EXIT_TIME_WINDOW),
-                    ),
-                )
-
-                result = cur.fetchone()
-
-                if result:
-                    print(f"[ACCESS GRANTED] Latest paid exit found for {plate_number}")
-                    return "GRANTED"
-                else:
-                    print(
-                        f"[ACCESS DENIED] No recent paid exit record for {plate_number}"
-                    )
-                    if arduino:
-                        for _ in range(5):  # Five alarm bursts (longer pattern)
-                            arduino.write(b"1")  # Open gate (triggers buzzer)
-                            time.sleep(0.7)  # Longer beep
-                            arduino.write(b"0")  # Close gate (stops buzzer)
-                            time.sleep(0.2)  # Short pause
-
-                    return "DENIED"
-
+        init_pool()
     except psycopg2.Error as e:
-        print(f"[DATABASE ERROR] {e}")
-        return "ERROR"
+        print(f"[DATABASE ERROR] Could not open connection pool: {e}")
+    # Incidents are written in the background, spooled to disk while offline
+    incidents.start()
+    # Local mirror of entries and payments, used when PostgreSQL is slow or down
+    local_state.start()
+    start_server()
 
-
-def main():
-    # Initialize Arduino
-    arduino_port = detect_arduino_port()
-    arduino = None
-    if arduino_port:
-        print(f"[CONNECTED] Arduino on {arduino_port}")
-        arduino = serial.Serial(arduino_port, 9600, timeout=1)
-        time.sleep(2)
-    else:
-        print("[ERROR] Arduino not detected.")
+    # Initialize Arduino (reconnects by itself if the USB device drops)
+    arduino = SerialTransport().start()
+    gate = GateController(arduino).start()
 
     # Initialize Webcam
     cap = cv2.VideoCapture(0)
     if not cap.isOpened():
         print("[ERROR] Cannot open camera")
-        if arduino:
-            arduino.close()
+        gate.stop()
+        arduino.close()
         return
+    open_windows("Exit Webcam Feed", args.headless)
 
-    plate_buffer = []
-    print("[EXIT SYSTEM] Ready. Press 'q' to quit.")
+    motion = MotionGate(parse_roi(args.roi))
+    lane = ExitLane(gate, arduino, motion)
 
-    try:
-        while True:
-            ret, frame = cap.read()
-            if not ret:
-                print("[ERROR] Failed to capture frame")
-                break
-
-            # Get distance reading, default to safe value
-            distance = read_distance(arduino) or (MAX_DISTANCE - 1)
-            print(f"[SENSOR] Distance: {distance} cm")
-
-            if MIN_DISTANCE <= distance <= MAX_DISTANCE:
-                results = model(frame)
-
-                for result in results:
-                    for box in result.boxes:
-                        x1, y1, x2, y2 = map(int, box.xyxy[0])
-                        plate_img = frame[y1:y2, x1:x2]
-
-                        # Preprocess
-                        gray = cv2.cvtColor(plate_img, cv2.COLOR_BGR2GRAY)
-                        blur = cv2.GaussianBlur(gray, (5, 5), 0)
-                        thresh = cv2.threshold(
-                            blur, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU
-                        )[1]
-
-                        # OCR
-                        plate_text = (
-                            pytesseract.image_to_string(
-                                thresh,
-                                config="--psm 8 --oem 3 -c tessedit_char_whitelist=ABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789",
-                            )
-                            .strip()
-                            .replace(" ", "")
-                        )
-
-                        if "RA" in plate_text:
-                            start_idx = plate_text.find("RA")
-                            plate_candidate = plate_text[start_idx:]
-                            if len(plate_candidate) >= 7:
-                                plate_candidate = plate_candidate[:7]
-                                prefix, digits, suffix = (
-                                    plate_candidate[:3],
-                                    plate_candidate[3:6],
-                                    plate_candidate[6],
-                                )
-                                if (
-                                    prefix.isalpha()
-                                    and prefix.isupper()
-                                    and digits.isdigit()
-                                    and suffix.isalpha()
-                                    and suffix.isupper()
-                                ):
-                                    print(f"[VALID] Plate Detected: {plate_candidate}")
-                                    plate_buffer.append(plate_candidate)
-
-                                    if len(plate_buffer) >= 3:
-                                        most_common = Counter(plate_buffer).most_common(
-                                            1
-                                        )[0][0]
-                                        plate_buffer.clear()
-
-                                        exit_status = handle_exit(most_common, arduino)
-
-                                        if exit_status == "GRANTED":
-                                            print(
-                                                f"[ACCESS GRANTED] Exit recorded for {most_common}"
-                                            )
-                                            if arduino:
-                                                arduino.write(b"1")  # Open gate
-                                                print("[GATE] Opening gate")
-                                                time.sleep(15)
-                                                arduino.write(b"0")  # Close gate
-                                                print("[GATE] Closing gate")
-                                        elif exit_status == "NO_ENTRY":
-                                            print(
-                                                f"[SECURITY ALERT] No entry record found for {most_common}"
-                                            )
-                                            # Alarm is already handled in handle_exit function
-                                        elif exit_status == "UNAUTHORIZED":
-                                            print(
-                                                f"[SECURITY ALERT] Unauthorized exit attempt by {most_common}"
-                                            )
-                                            # Alarm is already handled in handle_exit function
-                                        else:
-                                            print(
-                                                f"[ACCESS DENIED] Exit not allowed for {most_common}"
-                                            )
-                                            # Warning beep is already handled in handle_exit function
-
-                        cv2.imshow("Plate", plate_img)
-                        cv2.imshow("Processed", thresh)
-                        time.sleep(0.5)
-
-                annotated_frame = results[0].plot() if distance <= 50 else frame
-                cv2.imshow("Exit Webcam Feed", annotated_frame)
-
-            if cv2.waitKey(1) & 0xFF == ord("q"):
-                break
+    def process_detections(frame, results):
+        reads = lane.process(recognizer, frame, results)
+        for read in reads:
+            pipeline.preview("Plate", read.crop)
+            pipeline.preview("Processed", read.processed)
 
+    pipeline = FramePipeline(
+        cap,
+        infer=lambda image: recognizer.detect(image, motion.roi_bounds(image)),
+        decide=process_detections,
+        should_infer=lane.should_infer,
+    )
+
+    print("[EXIT SYSTEM] Ready. Press 'q' (or Ctrl+C when headless) to quit.")
+    try:
+        run_pipeline(pipeline, args, "Exit Webcam Feed")
     except Exception as e:
         print(f"[ERROR] An error occurred: {e}")
     finally:
-        if arduino:
-            arduino.close()
+        gate.stop()
+        local_state.stop()
+        incidents.stop()
+        recognizer.close()
+        arduino.close()
         cap.release()
-        cv2.destroyAllWindows()
 
 
 if __name__ == "__main__":
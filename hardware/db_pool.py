@@ -0,0 +1,141 @@
+"""
+Shared PostgreSQL connection pool used by the backend API and the
+entry, exit and payment processes.
+
+Connections are opened once and reused, so the gate decision path does not
+pay for a TCP/auth handshake per query. Idle connections are health-checked
+before reuse and broken ones are replaced transparently.
+"""
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+import psycopg2
+from psycopg2 import pool
+from psycopg2.extensions import QueryCanceledError
+
+# Database connection configuration (overridable through the environment)
+DB_CONFIG = {
+    "dbname": os.getenv("DB_NAME", "parking_system"),
+    "user": os.getenv("DB_USER", "jodos"),
+    "password": os.getenv("DB_PASSWORD", "jodos"),
+    "host": os.getenv("DB_HOST", "localhost"),
+    "port": os.getenv("DB_PORT", "5432"),
+}
+# Optional server-side cap on every statement, in milliseconds
+if os.getenv("DB_STATEMENT_TIMEOUT"):
+    DB_CONFIG["options"] = f"-c statement_timeout={int(os.getenv('DB_STATEMENT_TIMEOUT'))}"
+POOL_MIN_SIZE = int(os.getenv("DB_POOL_MIN", "1"))
+POOL_MAX_SIZE = int(os.getenv("DB_POOL_MAX", "5"))
+POOL_ACQUIRE_TIMEOUT = 5  # seconds to wait for a free connection
+HEALTH_CHECK_INTERVAL = 30  # seconds idle before a connection is re-validated
+
+_pool = None
+_slots = None
+_last_used = {}
+_lock = threading.Lock()
+
+# Errors that mean the connection itself is unusable
+CONNECTION_ERRORS = (psycopg2.OperationalError, psycopg2.InterfaceError)
+
+
+def init_pool(minconn=None, maxconn=None, **overrides):
+    """Open the pool eagerly (e.g. at process start-up). Safe to call twice."""
+    global _pool, _slots
+    with _lock:
+        if _pool is not None:
+            return _pool
+        minconn = POOL_MIN_SIZE if minconn is None else minconn
+        maxconn = POOL_MAX_SIZE if maxconn is None else maxconn
+        _pool = pool.ThreadedConnectionPool(
+            minconn, maxconn, **{**DB_CONFIG, **overrides}
+        )
+        _slots = threading.BoundedSemaphore(maxconn)
+        return _pool
+
+
+def close_pool():
+    global _pool, _slots
+    with _lock:
+        if _pool is not None:
+            _pool.closeall()
+        _pool = None
+        _slots = None
+        _last_used.clear()
+
+
+def _is_healthy(conn):
+    if conn.closed:
+        return False
+    if time.monotonic() - _last_used.get(id(conn), 0) < HEALTH_CHECK_INTERVAL:
+        return True
+    try:
+        with conn.cursor() as cur:
+            cur.execute("SELECT 1")
+        conn.rollback()
+        return True
+    except CONNECTION_ERRORS:
+        return False
+
+
+def _acquire():
+    db_pool = init_pool()
+    if not _slots.acquire(timeout=POOL_ACQUIRE_TIMEOUT):
+        raise pool.PoolError("Timed out waiting for a database connection")
+    try:
+        # Every pooled connection may be stale after a DB restart; try each
+        # once before opening a fresh one.
+        for _ in range(db_pool.maxconn + 1):
+            conn = db_pool.getconn()
+            if _is_healthy(conn):
+                return conn
+            print("[DATABASE] Replacing broken pooled connection")
+            _last_used.pop(id(conn), None)
+            db_pool.putconn(conn, close=True)
+        raise psycopg2.OperationalError("Could not obtain a healthy connection")
+    except Exception:
+        _slots.release()
+        raise
+
+
+def _release(conn, broken=False):
+    broken = broken or bool(conn.closed)
+    if broken:
+        _last_used.pop(id(conn), None)
+    else:
+        _last_used[id(conn)] = time.monotonic()
+    try:
+        _pool.putconn(conn, close=broken)
+    finally:
+        _slots.release()
+
+
+@contextmanager
+def get_db_connection():
+    """
+    Borrow a pooled connection. Commits when the block succeeds, rolls back
+    when it raises or is abandoned (e.g. a generator closed early), and
+    always returns the connection to the pool.
+    """
+    conn = _acquire()
+    broken = False
+    try:
+        yield conn
+        conn.commit()
+    except QueryCanceledError:
+        # A statement timeout; the connection itself is fine
+        if not conn.closed:
+            conn.rollback()
+        raise
+    except CONNECTION_ERRORS:
+        broken = True
+        raise
+    except BaseException:
+        # Also GeneratorExit, when a streamed response is cut off mid-way:
+        # never pool a connection left inside a transaction
+        if not conn.closed:
+            conn.rollback()
+        raise
+    finally:
+        _release(conn, broken)
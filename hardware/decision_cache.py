@@ -0,0 +1,65 @@
+"""
+In-process cache of recent gate decisions.
+
+A car idling at a barrier keeps being detected; once its plate has been
+decided, repeat sightings are answered from here instead of querying
+PostgreSQL (and raising the same alarm) again. Keys are (flow, plate), e.g.
+("entry", "RAB123C"). Entries expire after their TTL, and the least recently
+used entries are evicted once the cache holds DECISION_CACHE_SIZE plates.
+
+`recent_decisions` is shared by every lane in the process, so when the
+supervisor runs an exit lane that lets a car out, the entry lanes forget
+their earlier decision for it immediately.
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+
+DEFAULT_TTL = 300  # seconds
+DEFAULT_SIZE = 1024
+
+
+class DecisionCache:
+    def __init__(self, ttl=DEFAULT_TTL, max_size=DEFAULT_SIZE):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._entries = OrderedDict()  # key -> (decision, decided_at, expires_at)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        """Return (decision, age in seconds) for a live entry, or None"""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[2] <= now:
+                self._entries.pop(key, None)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0], now - entry[1]
+
+    def put(self, key, decision, ttl=None):
+        now = time.monotonic()
+        with self._lock:
+            self._entries[key] = (decision, now, now + (self.ttl if ttl is None else ttl))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def discard(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def stats(self):
+        with self._lock:
+            return {"size": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+
+recent_decisions = DecisionCache(
+    ttl=float(os.getenv("DECISION_CACHE_TTL", DEFAULT_TTL)),
+    max_size=int(os.getenv("DECISION_CACHE_SIZE", DEFAULT_SIZE)),
+)
@@ -0,0 +1,138 @@
+"""
+Threaded capture -> inference -> decision pipeline for the gate cameras.
+
+    capture thread    keeps only the newest camera frame
+    inference worker  runs the detector on the newest frame when allowed
+    decision worker   runs OCR and the gate decision on detector output
+
+Stages are connected by small bounded queues that drop the oldest item
+instead of blocking, so a slow stage never makes the others work on stale
+frames. OpenCV windows must be driven from the main thread, so workers only
+publish what should be displayed (`latest`, `previews`).
+"""
+import queue
+import threading
+import time
+from collections import namedtuple
+
+from metrics import frames_dropped, stage
+
+Frame = namedtuple("Frame", ["seq", "timestamp", "image"])
+
+
+class DroppingQueue(queue.Queue):
+    """Bounded queue that discards the oldest item instead of blocking the producer"""
+
+    def __init__(self, maxsize=1, name="queue"):
+        super().__init__(maxsize)
+        self.name = name
+        self.dropped = 0
+
+    def put_latest(self, item):
+        while True:
+            try:
+                self.put_nowait(item)
+                return
+            except queue.Full:
+                try:
+                    self.get_nowait()
+                    self.dropped += 1
+                    frames_dropped.labels(queue=self.name).inc()
+                except queue.Empty:
+                    pass
+
+
+class FramePipeline:
+    """
+    `infer(image)` returns detector results for a frame, `decide(frame, results)`
+    handles them (OCR, DB, gate). `should_infer(image)` is checked before each
+    inference, e.g. to gate on the distance sensor or on motion in the lane.
+    """
+
+    def __init__(self, cap, infer, decide, should_infer=None, queue_size=2):
+        self.cap = cap
+        self.infer = infer
+        self.decide = decide
+        self.should_infer = should_infer or (lambda image: True)
+        self.frames = DroppingQueue(1, name="frames")
+        self.detections = DroppingQueue(queue_size, name="detections")
+        self.latest = None  # (Frame, results or None) for display
+        self.previews = {}  # window name -> image, filled by decide()
+        self.counters = {"captured": 0, "skipped": 0, "inferred": 0, "decided": 0}
+        self._stop = threading.Event()
+        self._threads = []
+
+    @property
+    def running(self):
+        return not self._stop.is_set()
+
+    def start(self):
+        for target, name in (
+            (self._capture_loop, "capture"),
+            (self._inference_loop, "inference"),
+            (self._decision_loop, "decision"),
+        ):
+            thread = threading.Thread(target=target, name=name, daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self, timeout=2):
+        self._stop.set()
+        for thread in self._threads:
+            thread.join(timeout)
+
+    def preview(self, name, image):
+        """Publish an image for the main thread to display (ignored when headless)"""
+        if image is not None:
+            self.previews[name] = image
+
+    def stats(self):
+        return {
+            **self.counters,
+            "dropped_frames": self.frames.dropped,
+            "dropped_detections": self.detections.dropped,
+        }
+
+    def _capture_loop(self):
+        seq = 0
+        while self.running:
+            with stage("capture"):
+                ret, image = self.cap.read()
+            if not ret:
+                print("[ERROR] Frame capture failed.")
+                self._stop.set()
+                break
+            seq += 1
+            self.counters["captured"] += 1
+            self.frames.put_latest(Frame(seq, time.monotonic(), image))
+
+    def _inference_loop(self):
+        while self.running:
+            try:
+                frame = self.frames.get(timeout=0.1)
+            except queue.Empty:
+                continue
+            if not self.should_infer(frame.image):
+                self.counters["skipped"] += 1
+                self.latest = (frame, None)
+                continue
+            try:
+                results = self.infer(frame.image)
+            except Exception as e:
+                print(f"[ERROR] Inference failed: {e}")
+                continue
+            self.counters["inferred"] += 1
+            self.latest = (frame, results)
+            self.detections.put_latest((frame, results))
+
+    def _decision_loop(self):
+        while self.running:
+            try:
+                frame, results = self.detections.get(timeout=0.1)
+            except queue.Empty:
+                continue
+            try:
+                self.decide(frame, results)
+            except Exception as e:
+                print(f"[ERROR] Decision failed: {e}")
+            self.counters["decided"] += 1
@@ -0,0 +1,140 @@
+"""
+Non-blocking barrier and buzzer control.
+
+Gate openings and alarms are named patterns of (command, hold seconds)
+steps played by a background thread, so the recognition loop never sleeps
+while the barrier is open or an alarm sounds. A new pattern pre-empts the
+running one unless the running one has a higher priority; cancel() stops
+whatever is playing and returns the gate to the closed state.
+
+Opening the barrier for a granted car outranks every alarm: an alarm still
+sounding (e.g. for this car before it paid) is cut short. The other way
+round, every alarm ends with the barrier down, so an alarm never pre-empts
+an open barrier (the car under it was granted). It is deferred instead and
+played once the barrier has closed; of several deferred alarms the highest
+priority one is kept.
+"""
+import threading
+import time
+
+from metrics import stage
+
+OPEN = b"1"  # opens the barrier (also drives the buzzer)
+CLOSE = b"0"
+
+GATE_OPEN_TIME = 15  # seconds
+
+# name -> (priority, steps); OPEN pre-empts any alarm
+PATTERNS = {
+    "OPEN": (5, [(OPEN, GATE_OPEN_TIME), (CLOSE, 0)]),
+    "DENIED": (2, [(OPEN, 0.7), (CLOSE, 0.2)] * 5),
+    "UNAUTHORIZED": (3, [(OPEN, 0.5), (CLOSE, 0.3)] * 3),
+    "DOUBLE_ENTRY": (3, [(OPEN, 0.3), (CLOSE, 0.2)] * 4),
+    "NO_ENTRY": (4, [(OPEN, 0.7), (CLOSE, 0.2)] * 5),
+}
+
+
+class GateController:
+    def __init__(self, arduino, patterns=None):
+        self.arduino = arduino
+        self.patterns = patterns or PATTERNS
+        self.active = None  # name of the pattern being played
+        self._priority = 0
+        self._steps = []
+        self._deadline = 0
+        self._deferred = None  # alarm waiting for the open barrier to close
+        self._cond = threading.Condition()
+        self._stopped = False
+        self._thread = threading.Thread(target=self._run, name="gate", daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.cancel()
+        with self._cond:
+            self._stopped = True
+            self._cond.notify()
+        self._thread.join(timeout=1)
+
+    def play(self, name, steps=None):
+        """Start a named pattern. Returns False if a higher-priority one is playing."""
+        priority, default_steps = self.patterns[name]
+        with self._cond:
+            if self.active == "OPEN" and name != "OPEN":
+                if self._deferred is None or priority >= self.patterns[self._deferred][0]:
+                    self._deferred = name
+                print(f"[GATE] {name} deferred until the barrier closes")
+                return False
+            if self.active and priority < self._priority:
+                print(f"[GATE] {name} ignored while {self.active} is playing")
+                return False
+            if self.active:
+                print(f"[GATE] {name} pre-empts {self.active}")
+            self._start(name, priority, steps or default_steps)
+        return True
+
+    def _start(self, name, priority, steps):
+        self.active = name
+        self._priority = priority
+        self._steps = list(steps)
+        self._deadline = time.monotonic()
+        self._cond.notify()
+
+    def open_gate(self, duration=None):
+        steps = [(OPEN, duration), (CLOSE, 0)] if duration is not None else None
+        started = self.play("OPEN", steps)
+        if started:
+            print("[GATE] Opening gate")
+        return started
+
+    def alarm(self, name):
+        started = self.play(name)
+        if started:
+            print(f"[ALARM] Triggering {name} alarm")
+        return started
+
+    def cancel(self):
+        with self._cond:
+            if self.active:
+                print(f"[GATE] Cancelled {self.active}")
+            self._clear()
+            self._deferred = None
+            self._write(CLOSE)
+            self._cond.notify()
+
+    def _clear(self):
+        self.active = None
+        self._priority = 0
+        self._steps = []
+
+    def _write(self, command):
+        if self.arduino:
+            # Only the serial write: the Arduino does not report when the
+            # barrier has actually moved
+            with stage("gate_command"):
+                self.arduino.write(command)
+
+    def _run(self):
+        with self._cond:
+            while not self._stopped:
+                if not self._steps:
+                    self._cond.wait()
+                    continue
+                remaining = self._deadline - time.monotonic()
+                if remaining > 0:
+                    self._cond.wait(remaining)
+                    continue
+                command, hold = self._steps.pop(0)
+                self._write(command)
+                self._deadline = time.monotonic() + hold
+                if not self._steps:
+                    if self.active == "OPEN":
+                        print("[GATE] Closing gate")
+                    self._clear()
+                    if self._deferred:
+                        name, self._deferred = self._deferred, None
+                        print(f"[ALARM] Triggering deferred {name} alarm")
+                        priority, steps = self.patterns[name]
+                        self._start(name, priority, steps)
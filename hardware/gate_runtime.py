@@ -0,0 +1,92 @@
+"""
+Run-mode handling shared by the gate scripts: command-line options and the
+main-thread loop that either drives the OpenCV windows or, with --headless,
+skips every display/annotation path and optionally serves snapshots.
+"""
+import argparse
+import os
+import time
+
+from snapshot_server import SnapshotServer
+
+
+def parse_gate_args(description):
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument(
+        "--headless",
+        action="store_true",
+        help="no windows, previews or frame annotation",
+    )
+    parser.add_argument(
+        "--snapshot-port",
+        type=int,
+        help="serve /snapshot.jpg and /stream.mjpg on this port",
+    )
+    parser.add_argument(
+        "--snapshot-fps", type=float, default=1.0, help="MJPEG stream rate"
+    )
+    parser.add_argument(
+        "--roi",
+        default=os.getenv("LANE_ROI"),
+        help="lane region x1,y1,x2,y2 as frame fractions (default: whole frame)",
+    )
+    return parser.parse_args()
+
+
+def open_windows(feed_window, headless):
+    if headless:
+        return
+    import cv2
+
+    cv2.namedWindow(feed_window, cv2.WINDOW_NORMAL)
+    cv2.namedWindow("Plate", cv2.WINDOW_NORMAL)
+    cv2.namedWindow("Processed", cv2.WINDOW_NORMAL)
+    cv2.resizeWindow(feed_window, 800, 600)
+
+
+def run_pipeline(pipeline, args, feed_window):
+    """Block until the pipeline stops or the operator quits ('q' or Ctrl+C)"""
+    snapshots = None
+    if args.snapshot_port:
+        snapshots = SnapshotServer(
+            lambda: pipeline.latest[0] if pipeline.latest else None,
+            args.snapshot_port,
+            fps=args.snapshot_fps,
+        ).start()
+    pipeline.start()
+    try:
+        if args.headless:
+            while pipeline.running:
+                time.sleep(0.5)
+        else:
+            _display_loop(pipeline, feed_window)
+    except KeyboardInterrupt:
+        print("[EXIT] Program terminated")
+    finally:
+        pipeline.stop()
+        print(f"[PIPELINE] {pipeline.stats()}")
+        if snapshots:
+            snapshots.stop()
+        if not args.headless:
+            import cv2
+
+            cv2.destroyAllWindows()
+
+
+def _display_loop(pipeline, feed_window):
+    import cv2
+
+    shown_seq = 0
+    while pipeline.running:
+        latest = pipeline.latest
+        if latest and latest[0].seq != shown_seq:
+            frame, results = latest
+            shown_seq = frame.seq
+            annotated = results.plot() if results is not None else frame.image
+            cv2.imshow(feed_window, annotated)
+        for name, image in list(pipeline.previews.items()):
+            cv2.imshow(name, image)
+        pipeline.previews.clear()
+
+        if cv2.waitKey(1) & 0xFF == ord("q"):
+            break
@@ -0,0 +1,240 @@
+"""
+Background writer for security incidents.
+
+Gate decisions only queue an incident (log() never touches the database).
+A writer thread drains the queue and inserts every pending incident, with
+all of its fields, in one multi-row INSERT and one commit.
+
+If PostgreSQL is unreachable, the batch is appended to a local JSON-lines
+spool file (INCIDENT_SPOOL) and fsynced, so incidents survive a restart of
+the gate process. The writer replays the spool as soon as the database
+answers again, before any newer incidents, so incidents stay in time order.
+When the database rejects a batch outright (bad data, not a lost
+connection), its incidents are retried one by one and only the rows that
+fail go to INCIDENT_SPOOL + ".rejected".
+
+The entry and exit gates run as separate processes and share the spool
+file. Every access to it holds an exclusive lock on INCIDENT_SPOOL +
+".lock", and a replay keeps the lock until the spool has been written and
+removed. Lines appended by another process are therefore never deleted
+unread, and no spool is replayed twice.
+"""
+import json
+import os
+import queue
+import threading
+import time
+from collections import namedtuple
+from contextlib import contextmanager
+from datetime import datetime
+
+import psycopg2
+from psycopg2.extras import execute_values
+from psycopg2.pool import PoolError
+
+from db_pool import CONNECTION_ERRORS, get_db_connection
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+SPOOL_PATH = os.getenv("INCIDENT_SPOOL", "incident_spool.jsonl")
+OFFLINE_ERRORS = CONNECTION_ERRORS + (PoolError,)
+BATCH_SIZE = 100
+FLUSH_INTERVAL = 0.5  # seconds to collect a batch
+RETRY_INTERVAL = 5  # seconds between reconnect attempts while spooling
+
+Incident = namedtuple(
+    "Incident",
+    ["car_plate", "incident_type", "incident_time", "description", "additional_info"],
+)
+
+INSERT_INCIDENTS = """
+    INSERT INTO security_incidents
+    (car_plate, incident_type, incident_time, description, additional_info)
+    VALUES %s
+"""
+
+
+class IncidentWriter:
+    def __init__(self, spool_path=SPOOL_PATH, batch_size=BATCH_SIZE):
+        self.spool_path = spool_path
+        self.rejected_path = spool_path + ".rejected"
+        self.batch_size = batch_size
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._stopping = threading.Event()
+        self._next_replay = 0
+
+    def start(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name="incidents", daemon=True
+                )
+                self._thread.start()
+        return self
+
+    def stop(self, timeout=10):
+        """Write (or spool) everything still queued, then stop the thread"""
+        with self._lock:
+            thread = self._thread
+        if thread is None:
+            return
+        self._stopping.set()
+        thread.join(timeout=timeout)
+
+    def log(self, car_plate, incident_type, description, additional_info=None, incident_time=None):
+        self.start()
+        self._queue.put(
+            Incident(
+                car_plate,
+                incident_type,
+                incident_time or datetime.now(),
+                description,
+                additional_info,
+            )
+        )
+
+    def _take_batch(self):
+        batch = []
+        deadline = time.monotonic() + FLUSH_INTERVAL
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                if remaining <= 0:
+                    batch.append(self._queue.get_nowait())
+                else:
+                    batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            stopping = self._stopping.is_set()
+            batch = self._take_batch()
+            if os.path.exists(self.spool_path) and (
+                stopping or time.monotonic() >= self._next_replay
+            ):
+                self._replay()
+            if batch:
+                if os.path.exists(self.spool_path):
+                    # Still offline: keep the spool in time order
+                    self._spool(batch)
+                else:
+                    self._write(batch)
+            if stopping and self._queue.empty():
+                return
+
+    def _insert(self, incidents):
+        with get_db_connection() as conn:
+            with conn.cursor() as cur:
+                execute_values(cur, INSERT_INCIDENTS, incidents, page_size=self.batch_size)
+
+    def _insert_each(self, incidents):
+        """
+        Insert one by one after a batch was rejected, setting aside only the
+        rows the database refuses. Returns the rows left unwritten because
+        the database went offline meanwhile.
+        """
+        for i, incident in enumerate(incidents):
+            try:
+                self._insert([incident])
+            except OFFLINE_ERRORS:
+                self._next_replay = time.monotonic() + RETRY_INTERVAL
+                return incidents[i:]
+            except psycopg2.Error as e:
+                print(
+                    f"[DATABASE ERROR] Incident for {incident.car_plate} rejected, "
+                    f"see {self.rejected_path}: {e}"
+                )
+                _append(self.rejected_path, [incident])
+        return []
+
+    def _write(self, batch):
+        try:
+            self._insert(batch)
+        except OFFLINE_ERRORS as e:
+            print(f"[DATABASE ERROR] Incident write failed, spooling {len(batch)}: {e}")
+            self._next_replay = time.monotonic() + RETRY_INTERVAL
+            self._spool(batch)
+        except psycopg2.Error:
+            remaining = self._insert_each(batch)
+            if remaining:
+                self._spool(remaining)
+
+    def _replay(self):
+        with self._spool_lock():
+            # Another gate process may have replayed it while we waited
+            if not os.path.exists(self.spool_path):
+                return
+            with open(self.spool_path) as f:
+                incidents = [_decode(line) for line in f if line.strip()]
+            try:
+                self._insert(incidents)
+                remaining = []
+            except OFFLINE_ERRORS:
+                self._next_replay = time.monotonic() + RETRY_INTERVAL
+                return
+            except psycopg2.Error:
+                remaining = self._insert_each(incidents)
+            if remaining:
+                # Keep what is left, still oldest first, for the next replay
+                partial = f"{self.spool_path}.{os.getpid()}.tmp"
+                with open(partial, "w"):
+                    pass  # drop any leftover from a crash mid-replay
+                _append(partial, remaining)
+                os.replace(partial, self.spool_path)
+            else:
+                os.remove(self.spool_path)
+        print(f"[INCIDENTS] Replayed {len(incidents) - len(remaining)} spooled incidents")
+
+    def _spool(self, incidents):
+        with self._spool_lock():
+            _append(self.spool_path, incidents)
+
+    @contextmanager
+    def _spool_lock(self):
+        """Exclusive lock on the spool, shared with other gate processes"""
+        with open(self.spool_path + ".lock", "a+") as f:
+            if fcntl is not None:
+                fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+                else:
+                    f.seek(0)
+                    msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+def _append(path, incidents):
+    with open(path, "a") as f:
+        for incident in incidents:
+            f.write(_encode(incident) + "\n")
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def _encode(incident):
+    return json.dumps(
+        incident._replace(incident_time=incident.incident_time.isoformat())._asdict()
+    )
+
+
+def _decode(line):
+    incident = Incident(**json.loads(line))
+    return incident._replace(
+        incident_time=datetime.fromisoformat(incident.incident_time)
+    )
+
+
+incidents = IncidentWriter()
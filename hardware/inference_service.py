@@ -0,0 +1,152 @@
+"""
+Batched detector inference shared by several frame sources.
+
+Sources submit frames and get a Future back. A worker thread forms batches
+under a latency budget: it waits at most `max_wait` after the oldest frame
+arrived for more frames, takes frames round-robin across sources so a busy
+source cannot crowd out the others, and runs them through one batched call.
+
+The batch size adapts to the hardware: when a batch takes longer than
+`latency_budget` the target size shrinks, and while batches stay well under
+it the target grows back towards `max_batch_size`.
+"""
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import Future
+
+MAX_BATCH_SIZE = 8
+MAX_WAIT = 0.02  # seconds to wait for a batch to fill
+LATENCY_BUDGET = 0.25  # seconds one batched call may take
+LATENCY_WINDOW = 200  # recent frames kept for latency stats
+
+
+class InferenceService:
+    """`infer_batch(images, bounds)` returns one result per image, e.g. PlateRecognizer.detect_batch"""
+
+    def __init__(
+        self,
+        infer_batch,
+        max_batch_size=MAX_BATCH_SIZE,
+        max_wait=MAX_WAIT,
+        latency_budget=LATENCY_BUDGET,
+    ):
+        self.infer_batch = infer_batch
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.latency_budget = latency_budget
+        self.target_batch_size = max_batch_size
+        self._queues = OrderedDict()  # source -> deque of (submitted, image, bounds, future)
+        self._cond = threading.Condition()
+        self._stopped = False
+        self._latencies = deque(maxlen=LATENCY_WINDOW)
+        self._batches = 0
+        self._frames = 0
+        self._thread = threading.Thread(target=self._run, name="inference", daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        with self._cond:
+            self._stopped = True
+            self._cond.notify()
+        self._thread.join(timeout=2)
+
+    def submit(self, source, image, bounds=None):
+        future = Future()
+        with self._cond:
+            self._queues.setdefault(source, deque()).append(
+                (time.monotonic(), image, bounds, future)
+            )
+            self._cond.notify()
+        return future
+
+    def infer(self, source, image, bounds=None):
+        return self.submit(source, image, bounds).result()
+
+    def stats(self):
+        with self._cond:
+            latencies = sorted(self._latencies)
+            batches, frames = self._batches, self._frames
+        return {
+            "batches": batches,
+            "frames": frames,
+            "avg_batch_size": round(frames / batches, 2) if batches else 0,
+            "target_batch_size": self.target_batch_size,
+            "p50_latency_ms": _percentile_ms(latencies, 0.5),
+            "p95_latency_ms": _percentile_ms(latencies, 0.95),
+        }
+
+    def _pending(self):
+        return sum(len(q) for q in self._queues.values())
+
+    def _oldest(self):
+        return min(q[0][0] for q in self._queues.values() if q)
+
+    def _take_batch(self):
+        batch = []
+        while len(batch) < self.target_batch_size and self._pending():
+            for source in list(self._queues):
+                queue = self._queues[source]
+                if queue and len(batch) < self.target_batch_size:
+                    batch.append(queue.popleft())
+            # Rotate so the next batch starts with a different source
+            self._queues.move_to_end(next(iter(self._queues)))
+        return batch
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._pending() and not self._stopped:
+                    self._cond.wait()
+                if self._stopped:
+                    for queue in self._queues.values():
+                        for _, _, _, future in queue:
+                            future.cancel()
+                    return
+                deadline = self._oldest() + self.max_wait
+                while self._pending() < self.target_batch_size and not self._stopped:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                batch = self._take_batch()
+
+            started = time.monotonic()
+            try:
+                results = self.infer_batch(
+                    [image for _, image, _, _ in batch],
+                    [bounds for _, _, bounds, _ in batch],
+                )
+            except Exception as e:
+                for _, _, _, future in batch:
+                    future.set_exception(e)
+                continue
+            finished = time.monotonic()
+
+            for (_, _, _, future), result in zip(batch, results):
+                future.set_result(result)
+            self._record(batch, started, finished)
+
+    def _record(self, batch, started, finished):
+        elapsed = finished - started
+        with self._cond:
+            self._batches += 1
+            self._frames += len(batch)
+            self._latencies.extend(finished - submitted for submitted, _, _, _ in batch)
+            if elapsed > self.latency_budget and self.target_batch_size > 1:
+                self.target_batch_size -= 1
+            elif (
+                elapsed < 0.7 * self.latency_budget
+                and len(batch) == self.target_batch_size
+                and self.target_batch_size < self.max_batch_size
+            ):
+                self.target_batch_size += 1
+
+
+def _percentile_ms(values, fraction):
+    if not values:
+        return None
+    return round(values[min(len(values) - 1, int(len(values) * fraction))] * 1000, 1)
@@ -0,0 +1,336 @@
+"""
+Local SQLite mirror of the parking state the gates decide on.
+
+A sync thread copies parking entries from PostgreSQL incrementally, polling
+for rows whose updated_at (database/migrations/004_entry_change_tracking.sql)
+moved since the last sync. Active entries and the last SYNC_HISTORY_DAYS of
+visits are kept. With the mirror, a gate still makes decisions when
+PostgreSQL is slow or down:
+
+    * exit decisions are answered from the mirror while it is fresh;
+      anything other than GRANTED is confirmed against PostgreSQL when it
+      is reachable, since a payment may not have synced yet
+    * entries are admitted through admit_vehicle() as usual; if that fails,
+      the car is admitted locally and the admission is queued, then replayed
+      through admit_vehicle() with its original time when the database
+      returns. An admission PostgreSQL rejects outright (an error other than
+      a lost connection) would fail forever and block syncing; it is moved
+      to rejected_entries and logged instead.
+
+The mirror lives in GATE_STATE_DB (default gate_state.sqlite3 in the working
+directory) and survives restarts, so a gate that starts while the database
+is down still has the last known state.
+"""
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime, timedelta
+
+import psycopg2
+from psycopg2.pool import PoolError
+
+from db_pool import CONNECTION_ERRORS, get_db_connection
+from incident_writer import incidents
+
+STATE_PATH = os.getenv("GATE_STATE_DB", "gate_state.sqlite3")
+SYNC_INTERVAL = float(os.getenv("GATE_STATE_SYNC_INTERVAL", 2))  # seconds
+STALE_AFTER = 10  # seconds without a sync before the mirror is not trusted first
+SYNC_OVERLAP = timedelta(seconds=60)  # re-read window for late commits
+SYNC_HISTORY_DAYS = 30
+SYNC_PAGE_SIZE = 5000
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    id INTEGER PRIMARY KEY,  -- negative for admissions not yet reconciled
+    car_plate TEXT NOT NULL,
+    entry_time TEXT NOT NULL,
+    exit_time TEXT,
+    payment_status INTEGER NOT NULL,
+    updated_at TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_entries_plate ON entries (car_plate, exit_time);
+CREATE TABLE IF NOT EXISTS pending_entries (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    car_plate TEXT NOT NULL,
+    entry_time TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS rejected_entries (
+    id INTEGER PRIMARY KEY,
+    car_plate TEXT NOT NULL,
+    entry_time TEXT NOT NULL,
+    error TEXT NOT NULL,
+    rejected_at TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+"""
+
+CHANGES_QUERY = """
+    SELECT id, car_plate, entry_time, exit_time, payment_status, updated_at
+    FROM parking_entries
+    WHERE (updated_at, id) > (%s, %s)
+    AND (exit_time IS NULL OR entry_time > %s)
+    ORDER BY updated_at, id
+    LIMIT %s
+"""
+
+LOCAL_EXIT_STATE_QUERY = """
+    SELECT
+        EXISTS (SELECT 1 FROM entries WHERE car_plate = :plate) AS has_entry,
+        (
+            SELECT id FROM entries
+            WHERE car_plate = :plate AND exit_time IS NULL AND payment_status = 0
+            ORDER BY entry_time DESC LIMIT 1
+        ) AS unpaid_entry_id,
+        (
+            SELECT MAX(exit_time) FROM entries
+            WHERE car_plate = :plate AND payment_status = 1 AND exit_time IS NOT NULL
+        ) AS last_paid_exit
+"""
+
+OFFLINE_ERRORS = CONNECTION_ERRORS + (PoolError,)
+
+
+def _timestamp(value):
+    return value.isoformat() if value is not None else None
+
+
+def _datetime(value):
+    return datetime.fromisoformat(value) if value is not None else None
+
+
+class LocalState:
+    def __init__(self, path=STATE_PATH):
+        self.path = path
+        self._db = None
+        self._lock = threading.Lock()
+        self._stopping = threading.Event()
+        self._thread = None
+        self._last_sync = None  # monotonic time of the last successful sync
+
+    def start(self):
+        """Open the mirror and start syncing. Safe to call twice."""
+        with self._lock:
+            if self._db is not None:
+                return self
+            self._db = sqlite3.connect(self.path, timeout=5, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.executescript(SCHEMA)
+            self._thread = threading.Thread(target=self._run, name="state-sync", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        if self._thread is None:
+            return
+        self._stopping.set()
+        self._thread.join(timeout=5)
+        with self._lock:
+            self._db.close()
+            self._db = None
+
+    @property
+    def ready(self):
+        """True once the mirror has been synced at least once (in any run)"""
+        return self._meta("synced_at") is not None
+
+    @property
+    def fresh(self):
+        return self._last_sync is not None and time.monotonic() - self._last_sync < STALE_AFTER
+
+    # ===== Decisions =====
+
+    def exit_state(self, plate):
+        """Same fields as car_exit.EXIT_STATE_QUERY, from the mirror; None if it is not ready"""
+        if not self.ready:
+            return None
+        with self._lock:
+            has_entry, unpaid_entry_id, last_paid_exit = self._db.execute(
+                LOCAL_EXIT_STATE_QUERY, {"plate": plate}
+            ).fetchone()
+        return {
+            "has_entry": bool(has_entry),
+            "unpaid_entry_id": unpaid_entry_id,
+            "last_paid_exit": _datetime(last_paid_exit),
+        }
+
+    def admit_offline(self, plate, now):
+        """
+        Admit while PostgreSQL is unreachable. Returns a row shaped like
+        admit_vehicle() (incident_id is None: the incident is queued), or None
+        if the mirror is not ready.
+        """
+        if not self.ready:
+            return None
+        with self._lock, self._db:
+            active = self._db.execute(
+                """
+                SELECT id, entry_time, payment_status FROM entries
+                WHERE car_plate = ? AND exit_time IS NULL
+                ORDER BY entry_time DESC LIMIT 1
+                """,
+                (plate,),
+            ).fetchone()
+            if active:
+                entry_id, active_since, active_paid = active
+                incidents.log(
+                    plate,
+                    "DOUBLE_ENTRY_ATTEMPT",
+                    f"Vehicle {plate} attempted to enter while already inside parking",
+                    f"Original entry time: {_datetime(active_since)}, "
+                    f"Payment status: {'Paid' if active_paid else 'Unpaid'}",
+                    incident_time=now,
+                )
+                return False, entry_id, _datetime(active_since), bool(active_paid), None
+
+            pending_id = self._db.execute(
+                "INSERT INTO pending_entries (car_plate, entry_time) VALUES (?, ?)",
+                (plate, _timestamp(now)),
+            ).lastrowid
+            self._db.execute(
+                "INSERT INTO entries (id, car_plate, entry_time, payment_status) VALUES (?, ?, ?, 0)",
+                (-pending_id, plate, _timestamp(now)),
+            )
+        return True, -pending_id, None, None, None
+
+    def record_entry(self, entry_id, plate, entry_time):
+        """Mirror an admission made online right away instead of on the next sync"""
+        if self._db is None:
+            return
+        with self._lock, self._db:
+            self._db.execute(
+                """
+                INSERT OR IGNORE INTO entries (id, car_plate, entry_time, payment_status)
+                VALUES (?, ?, ?, 0)
+                """,
+                (entry_id, plate, _timestamp(entry_time)),
+            )
+
+    # ===== Sync =====
+
+    def _meta(self, key):
+        if self._db is None:
+            return None
+        with self._lock:
+            row = self._db.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def _run(self):
+        online = True
+        while not self._stopping.is_set():
+            try:
+                self._push()
+                self._pull()
+                self._last_sync = time.monotonic()
+                if not online:
+                    print("[STATE] PostgreSQL reachable again, local state synced")
+                    online = True
+            except OFFLINE_ERRORS as e:
+                if online:
+                    print(f"[STATE] PostgreSQL unreachable, deciding from local state: {e}")
+                    online = False
+            except psycopg2.Error as e:
+                print(f"[DATABASE ERROR] State sync failed: {e}")
+            self._stopping.wait(SYNC_INTERVAL)
+
+    def _pull(self):
+        newest = _datetime(self._meta("watermark"))
+        since = newest - SYNC_OVERLAP if newest else datetime.min
+        last_id = 0
+        history = datetime.now() - timedelta(days=SYNC_HISTORY_DAYS)
+        while True:
+            with get_db_connection() as conn:
+                with conn.cursor() as cur:
+                    cur.execute(CHANGES_QUERY, (since, last_id, history, SYNC_PAGE_SIZE))
+                    rows = cur.fetchall()
+            with self._lock, self._db:
+                self._db.executemany(
+                    """
+                    INSERT INTO entries (id, car_plate, entry_time, exit_time, payment_status, updated_at)
+                    VALUES (?, ?, ?, ?, ?, ?)
+                    ON CONFLICT (id) DO UPDATE SET
+                        car_plate = excluded.car_plate,
+                        entry_time = excluded.entry_time,
+                        exit_time = excluded.exit_time,
+                        payment_status = excluded.payment_status,
+                        updated_at = excluded.updated_at
+                    """,
+                    [
+                        (id_, plate, _timestamp(entry), _timestamp(exit_), int(paid), _timestamp(updated))
+                        for id_, plate, entry, exit_, paid, updated in rows
+                    ],
+                )
+            if rows:
+                since, last_id = rows[-1][5], rows[-1][0]
+                newest = since if newest is None else max(newest, since)
+            if len(rows) < SYNC_PAGE_SIZE:
+                break
+
+        with self._lock, self._db:
+            if newest:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO meta (key, value) VALUES ('watermark', ?)",
+                    (_timestamp(newest),),
+                )
+            self._db.execute(
+                "INSERT OR REPLACE INTO meta (key, value) VALUES ('synced_at', ?)",
+                (_timestamp(datetime.now()),),
+            )
+            self._db.execute(
+                "DELETE FROM entries WHERE id > 0 AND exit_time IS NOT NULL AND entry_time < ?",
+                (_timestamp(history),),
+            )
+
+    def _push(self):
+        """Replay offline admissions through admit_vehicle(), oldest first"""
+        with self._lock:
+            pending = self._db.execute(
+                "SELECT id, car_plate, entry_time FROM pending_entries ORDER BY id"
+            ).fetchall()
+        for pending_id, plate, entry_time in pending:
+            # Claim the row first so another gate process on the same file skips it
+            with self._lock, self._db:
+                claimed = self._db.execute(
+                    "DELETE FROM pending_entries WHERE id = ?", (pending_id,)
+                ).rowcount
+            if not claimed:
+                continue
+            try:
+                with get_db_connection() as conn:
+                    with conn.cursor() as cur:
+                        cur.execute(
+                            "SELECT admitted, entry_id FROM admit_vehicle(%s, %s)",
+                            (plate, _datetime(entry_time)),
+                        )
+                        admitted, entry_id = cur.fetchone()
+            except OFFLINE_ERRORS:
+                with self._lock, self._db:
+                    self._db.execute(
+                        "INSERT INTO pending_entries (id, car_plate, entry_time) VALUES (?, ?, ?)",
+                        (pending_id, plate, entry_time),
+                    )
+                raise
+            except psycopg2.Error as e:
+                # Retrying cannot succeed; set it aside and keep syncing
+                with self._lock, self._db:
+                    self._db.execute(
+                        """
+                        INSERT INTO rejected_entries (id, car_plate, entry_time, error, rejected_at)
+                        VALUES (?, ?, ?, ?, ?)
+                        """,
+                        (pending_id, plate, entry_time, str(e), _timestamp(datetime.now())),
+                    )
+                    self._db.execute("DELETE FROM entries WHERE id = ?", (-pending_id,))
+                print(f"[DATABASE ERROR] Offline entry of {plate} at {entry_time} rejected: {e}")
+                continue
+
+            with self._lock, self._db:
+                self._db.execute("DELETE FROM entries WHERE id = ?", (-pending_id,))
+            if admitted:
+                self.record_entry(entry_id, plate, _datetime(entry_time))
+                print(f"[STATE] Reconciled offline entry of {plate} as entry #{entry_id}")
+            else:
+                print(f"[STATE] Offline entry of {plate} conflicted with an active entry; incident logged")
+
+
+local_state = LocalState()
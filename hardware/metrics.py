@@ -0,0 +1,119 @@
+"""
+Prometheus metrics for the gate pipeline.
+
+    gate_stage_seconds{stage}               capture, yolo, preprocess, ocr,
+                                            decision, gate_command (the serial
+                                            write, not the barrier's movement)
+    gate_frames_dropped_total{queue}        frames/detections replaced before
+                                            a slower stage took them
+    gate_ocr_attempts_per_vehicle           OCR reads a track needed before its
+                                            plate was final
+    gate_decisions_total{gate, outcome}     ADMITTED, DOUBLE_ENTRY, GRANTED,
+                                            DENIED, UNAUTHORIZED, NO_ENTRY, ERROR
+    gate_db_query_seconds{query}            decision queries against PostgreSQL
+
+prometheus_client is optional: without it every metric is a no-op. Gate
+processes and the backend on one machine share their samples when they all
+run with the same PROMETHEUS_MULTIPROC_DIR (an empty directory, cleared
+before start-up); the backend's GET /metrics then reports every process.
+Otherwise METRICS_PORT makes a gate process serve its own /metrics.
+"""
+import os
+from contextlib import contextmanager
+
+try:
+    import prometheus_client
+    from prometheus_client import multiprocess
+except ImportError:
+    prometheus_client = None
+
+LATENCY_BUCKETS = (
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0
+)
+ATTEMPT_BUCKETS = (1, 2, 3, 4, 5, 6, 8, 10, 15)
+
+
+class _NoopMetric:
+    """Stands in for a metric when prometheus_client is not installed"""
+
+    def labels(self, *args, **kwargs):
+        return self
+
+    def inc(self, amount=1):
+        pass
+
+    def observe(self, value):
+        pass
+
+    @contextmanager
+    def time(self):
+        yield
+
+
+def histogram(name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+    if prometheus_client is None:
+        return _NoopMetric()
+    return prometheus_client.Histogram(name, documentation, labelnames, buckets=buckets)
+
+
+def counter(name, documentation, labelnames=()):
+    if prometheus_client is None:
+        return _NoopMetric()
+    return prometheus_client.Counter(name, documentation, labelnames)
+
+
+stage_seconds = histogram(
+    "gate_stage_seconds", "Time spent in each gate pipeline stage", ["stage"]
+)
+frames_dropped = counter(
+    "gate_frames_dropped_total", "Items dropped by the pipeline's queues", ["queue"]
+)
+ocr_attempts = histogram(
+    "gate_ocr_attempts_per_vehicle",
+    "OCR reads per tracked vehicle until its plate was final",
+    buckets=ATTEMPT_BUCKETS,
+)
+decisions = counter(
+    "gate_decisions_total", "Gate decisions by outcome", ["gate", "outcome"]
+)
+db_query_seconds = histogram(
+    "gate_db_query_seconds", "Gate decision queries against PostgreSQL", ["query"]
+)
+
+
+def stage(name):
+    """Context manager timing one pipeline stage"""
+    return stage_seconds.labels(stage=name).time()
+
+
+def _registry():
+    if "PROMETHEUS_MULTIPROC_DIR" in os.environ:
+        registry = prometheus_client.CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return registry
+    return prometheus_client.REGISTRY
+
+
+def render():
+    """(body, content type) in the Prometheus text format, or None without prometheus_client"""
+    if prometheus_client is None:
+        return None
+    return prometheus_client.generate_latest(_registry()), prometheus_client.CONTENT_TYPE_LATEST
+
+
+def start_server(port=None):
+    """Serve /metrics from this process if METRICS_PORT (or `port`) is set"""
+    port = port or os.getenv("METRICS_PORT")
+    if not port:
+        return
+    if prometheus_client is None:
+        print("[METRICS] prometheus_client not installed, metrics disabled")
+        return
+    prometheus_client.start_http_server(int(port), registry=_registry())
+    print(f"[METRICS] Serving /metrics on port {port}")
+
+
+def mark_process_dead(pid):
+    """Drop a finished process's live samples (multiprocess mode)"""
+    if prometheus_client is not None and "PROMETHEUS_MULTIPROC_DIR" in os.environ:
+        multiprocess.mark_process_dead(pid)
@@ -0,0 +1,96 @@
+"""
+Cheap pre-filter that decides whether a frame is worth running YOLO on.
+
+Each frame's lane ROI is downscaled to grayscale and differenced against the
+previous one. YOLO runs when:
+
+    * the ROI changed (something is moving in the lane), or
+    * a vehicle has just come to rest: motion was seen and the ROI has then
+      been stable for `stable_frames` frames (the best moment to read a plate).
+
+After that single "settled" inference, a static scene (parked car, empty
+lane) is not inferred again until something changes. The detector is then
+run on the ROI crop only (see PlateRecognizer.detect).
+"""
+import cv2
+import numpy as np
+
+# Lane region as fractions of the frame: x1, y1, x2, y2
+DEFAULT_ROI = (0.0, 0.0, 1.0, 1.0)
+MOTION_THRESHOLD = 25  # per-pixel gray level change counted as motion
+MOTION_FRACTION = 0.01  # share of changed pixels that counts as a changed frame
+STABLE_FRAMES = 5
+SAMPLE_WIDTH = 160  # motion is measured on a small copy of the ROI
+
+
+def parse_roi(value):
+    """'x1,y1,x2,y2' frame fractions (--roi / LANE_ROI) -> tuple"""
+    if not value:
+        return DEFAULT_ROI
+    x1, y1, x2, y2 = (float(v) for v in value.split(","))
+    if not (0 <= x1 < x2 <= 1 and 0 <= y1 < y2 <= 1):
+        raise ValueError(f"Invalid ROI: {value}")
+    return x1, y1, x2, y2
+
+
+class MotionGate:
+    def __init__(
+        self,
+        roi=None,
+        threshold=MOTION_THRESHOLD,
+        min_fraction=MOTION_FRACTION,
+        stable_frames=STABLE_FRAMES,
+    ):
+        self.roi = roi or DEFAULT_ROI
+        self.threshold = threshold
+        self.min_fraction = min_fraction
+        self.stable_frames = stable_frames
+        self._previous = None
+        self._stable_count = 0
+        self._settled = True  # nothing has moved yet
+        self.counters = {"checked": 0, "passed": 0}
+
+    def roi_bounds(self, image):
+        height, width = image.shape[:2]
+        x1, y1, x2, y2 = self.roi
+        return int(x1 * width), int(y1 * height), int(x2 * width), int(y2 * height)
+
+    def crop(self, image):
+        x1, y1, x2, y2 = self.roi_bounds(image)
+        return image[y1:y2, x1:x2], (x1, y1)
+
+    def _sample(self, image):
+        roi, _ = self.crop(image)
+        scale = SAMPLE_WIDTH / roi.shape[1]
+        small = cv2.resize(
+            roi, (SAMPLE_WIDTH, max(1, int(roi.shape[0] * scale))),
+            interpolation=cv2.INTER_AREA,
+        )
+        gray = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+        return cv2.GaussianBlur(gray, (5, 5), 0)
+
+    def changed_fraction(self, sample):
+        if self._previous is None or self._previous.shape != sample.shape:
+            return 1.0
+        diff = cv2.absdiff(sample, self._previous)
+        return np.count_nonzero(diff > self.threshold) / diff.size
+
+    def should_infer(self, image):
+        """True if this frame is new enough to be worth a detector pass"""
+        sample = self._sample(image)
+        moving = self.changed_fraction(sample) >= self.min_fraction
+        self._previous = sample
+        self.counters["checked"] += 1
+
+        if moving:
+            self._stable_count = 0
+            self._settled = False
+            run = True
+        else:
+            self._stable_count += 1
+            # One extra pass once a moving vehicle has come to rest
+            run = not self._settled and self._stable_count >= self.stable_frames
+            if run:
+                self._settled = True
+        self.counters["passed"] += run
+        return run
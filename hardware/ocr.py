@@ -0,0 +1,248 @@
+"""
+OCR backends for plate crops.
+
+Every backend turns a preprocessed (grayscale/binary) plate crop into an
+OcrResult and can read all crops of a frame in one call:
+
+    tesserocr  persistent in-process Tesseract engines, no process spawn per box
+    tesseract  pytesseract CLI fallback; batches a frame's crops into one call
+    onnx       lightweight CTC recognizer exported to ONNX (OCR_MODEL path)
+
+Pick one with OCR_BACKEND (default "auto": tesserocr when installed, else
+the CLI). Other recognizers can be added with register_backend().
+"""
+import os
+import threading
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+OcrResult = namedtuple("OcrResult", ["text", "confidence"])
+
+PLATE_CHARS = "ABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789"
+TESSERACT_CONFIG = f"--psm 8 --oem 3 -c tessedit_char_whitelist={PLATE_CHARS}"
+EMPTY = OcrResult("", 0.0)
+
+
+def _clean(text):
+    return "".join(text.split())
+
+
+class OcrBackend:
+    name = None
+
+    def read(self, image):
+        raise NotImplementedError
+
+    def read_batch(self, images):
+        return [self.read(image) for image in images]
+
+    def close(self):
+        pass
+
+
+class TesserocrBackend(OcrBackend):
+    """
+    Keeps `workers` Tesseract engines loaded for the life of the process.
+    tesserocr releases the GIL while recognizing, so a batch is spread
+    across the engines in parallel.
+    """
+
+    name = "tesserocr"
+
+    def __init__(self, workers=2):
+        from tesserocr import OEM, PSM, PyTessBaseAPI
+
+        self._apis = []
+        for _ in range(workers):
+            api = PyTessBaseAPI(psm=PSM.SINGLE_WORD, oem=OEM.DEFAULT)
+            api.SetVariable("tessedit_char_whitelist", PLATE_CHARS)
+            self._apis.append(api)
+        self._free = list(self._apis)
+        self._lock = threading.Condition()
+        self._executor = ThreadPoolExecutor(max_workers=workers)
+
+    def _borrow(self):
+        with self._lock:
+            while not self._free:
+                self._lock.wait()
+            return self._free.pop()
+
+    def _give_back(self, api):
+        with self._lock:
+            self._free.append(api)
+            self._lock.notify()
+
+    def read(self, image):
+        if image.size == 0:
+            return EMPTY
+        image = np.ascontiguousarray(image)
+        height, width = image.shape[:2]
+        channels = 1 if image.ndim == 2 else image.shape[2]
+        api = self._borrow()
+        try:
+            api.SetImageBytes(
+                image.tobytes(), width, height, channels, width * channels
+            )
+            text = api.GetUTF8Text()
+            confidence = api.MeanTextConf() / 100.0
+        finally:
+            self._give_back(api)
+        return OcrResult(_clean(text), confidence)
+
+    def read_batch(self, images):
+        if len(images) <= 1:
+            return [self.read(image) for image in images]
+        return list(self._executor.map(self.read, images))
+
+    def close(self):
+        self._executor.shutdown(wait=False)
+        for api in self._apis:
+            api.End()
+
+
+class TesseractCliBackend(OcrBackend):
+    """
+    pytesseract fallback. A batch is stacked into one image and read as a
+    block of lines, so a frame costs one tesseract process instead of one per
+    box; if the line count does not match, it falls back to per-crop reads.
+    """
+
+    name = "tesseract"
+    LINE_HEIGHT = 64
+    PADDING = 16
+
+    def __init__(self):
+        import pytesseract
+
+        self._tesseract = pytesseract
+
+    def _read_data(self, image, config):
+        data = self._tesseract.image_to_data(
+            image, config=config, output_type=self._tesseract.Output.DICT
+        )
+        lines = {}
+        for text, conf, block, par, line in zip(
+            data["text"], data["conf"], data["block_num"], data["par_num"], data["line_num"]
+        ):
+            if not text.strip():
+                continue
+            words = lines.setdefault((block, par, line), [])
+            words.append((text, max(float(conf), 0.0) / 100.0))
+        return [
+            OcrResult(
+                _clean("".join(text for text, _ in words)),
+                sum(conf for _, conf in words) / len(words),
+            )
+            for _, words in sorted(lines.items())
+        ]
+
+    def read(self, image):
+        if image.size == 0:
+            return EMPTY
+        lines = self._read_data(image, TESSERACT_CONFIG)
+        return lines[0] if lines else EMPTY
+
+    def read_batch(self, images):
+        images = list(images)
+        if len(images) <= 1 or any(image.size == 0 or image.ndim != 2 for image in images):
+            return [self.read(image) for image in images]
+
+        import cv2
+
+        rows = []
+        for image in images:
+            scale = self.LINE_HEIGHT / image.shape[0]
+            rows.append(cv2.resize(image, (max(1, int(image.shape[1] * scale)), self.LINE_HEIGHT)))
+        width = max(row.shape[1] for row in rows) + 2 * self.PADDING
+        sheet = np.full(
+            ((self.LINE_HEIGHT + self.PADDING) * len(rows) + self.PADDING, width),
+            255,
+            dtype=np.uint8,
+        )
+        for i, row in enumerate(rows):
+            top = self.PADDING + i * (self.LINE_HEIGHT + self.PADDING)
+            sheet[top:top + self.LINE_HEIGHT, self.PADDING:self.PADDING + row.shape[1]] = row
+
+        lines = self._read_data(sheet, TESSERACT_CONFIG.replace("--psm 8", "--psm 6"))
+        if len(lines) != len(images):
+            return [self.read(image) for image in images]
+        return lines
+
+
+class OnnxRecognizerBackend(OcrBackend):
+    """
+    Lightweight CTC plate recognizer (e.g. a small CRNN) exported to ONNX.
+    Expects a float32 [N, 1, H, W] input scaled to 0..1 and [N, T, C] class
+    scores where class 0 is the CTC blank and 1..C-1 map to PLATE_CHARS.
+    """
+
+    name = "onnx"
+
+    def __init__(self, model_path=None):
+        import onnxruntime
+
+        model_path = model_path or os.getenv("OCR_MODEL")
+        if not model_path:
+            raise ValueError("OCR_MODEL must point to the recognizer .onnx file")
+        self._session = onnxruntime.InferenceSession(
+            model_path, providers=["CPUExecutionProvider"]
+        )
+        model_input = self._session.get_inputs()[0]
+        self._input_name = model_input.name
+        self._height, self._width = model_input.shape[2], model_input.shape[3]
+
+    def _prepare(self, image):
+        import cv2
+
+        if image.ndim == 3:
+            image = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+        return cv2.resize(image, (self._width, self._height)).astype(np.float32) / 255.0
+
+    def read(self, image):
+        return self.read_batch([image])[0]
+
+    def read_batch(self, images):
+        if not images:
+            return []
+        usable = [i for i, image in enumerate(images) if image.size]
+        results = [EMPTY] * len(images)
+        if not usable:
+            return results
+        batch = np.stack([self._prepare(images[i]) for i in usable])[:, None]
+        scores = self._session.run(None, {self._input_name: batch})[0]
+        for i, seq in zip(usable, scores):
+            exp = np.exp(seq - seq.max(axis=1, keepdims=True))
+            probs = exp / exp.sum(axis=1, keepdims=True)
+            best = probs.argmax(axis=1)
+            chars, confs, previous = [], [], 0
+            for step, label in enumerate(best):
+                if label != previous and label != 0:
+                    chars.append(PLATE_CHARS[label - 1])
+                    confs.append(probs[step, label])
+                previous = label
+            results[i] = OcrResult("".join(chars), float(np.mean(confs)) if confs else 0.0)
+        return results
+
+
+BACKENDS = {
+    TesserocrBackend.name: TesserocrBackend,
+    TesseractCliBackend.name: TesseractCliBackend,
+    OnnxRecognizerBackend.name: OnnxRecognizerBackend,
+}
+
+
+def register_backend(name, factory):
+    BACKENDS[name] = factory
+
+
+def create_backend(name=None, **kwargs):
+    name = name or os.getenv("OCR_BACKEND", "auto")
+    if name != "auto":
+        return BACKENDS[name](**kwargs)
+    try:
+        return TesserocrBackend(**kwargs)
+    except ImportError:
+        print("[OCR] tesserocr not installed, falling back to the tesseract CLI")
+        return TesseractCliBackend()
@@ -0,0 +1,157 @@
+"""
+Plate detector runtimes.
+
+    pytorch   the trained best.pt through ultralytics (imports torch)
+    onnx      an exported (optionally INT8-quantized) ONNX model on onnxruntime
+    openvino  an exported OpenVINO IR on the OpenVINO CPU plugin
+
+The exported runtimes do their own letterboxing, decoding and NMS, so they
+never import torch or ultralytics; that is most of the cold-start time on the
+gate cabinets. Choose with DETECTOR_RUNTIME and optionally DETECTOR_MODEL;
+model_dev/scripts/export_model.py produces the default exported files.
+
+Every runtime's detect_batch(images) returns one (xyxy, conf) pair of numpy
+arrays per image, in that image's pixel coordinates.
+"""
+import os
+import time
+
+import cv2
+import numpy as np
+
+WEIGHTS_DIR = "../model_dev/runs/detect/train/weights"
+DEFAULT_MODELS = {
+    "pytorch": f"{WEIGHTS_DIR}/best.pt",
+    "onnx": f"{WEIGHTS_DIR}/best_int8.onnx",
+    "openvino": f"{WEIGHTS_DIR}/best_int8_openvino_model/best.xml",
+}
+IMAGE_SIZE = 640
+CONF_THRESHOLD = 0.25
+IOU_THRESHOLD = 0.45
+
+
+def letterbox(image, size=IMAGE_SIZE):
+    """Resize keeping aspect ratio and pad to size x size; returns (image, scale, (pad_x, pad_y))"""
+    height, width = image.shape[:2]
+    scale = min(size / height, size / width)
+    resized_w, resized_h = round(width * scale), round(height * scale)
+    pad_x, pad_y = (size - resized_w) // 2, (size - resized_h) // 2
+    canvas = np.full((size, size, 3), 114, dtype=np.uint8)
+    canvas[pad_y:pad_y + resized_h, pad_x:pad_x + resized_w] = cv2.resize(
+        image, (resized_w, resized_h), interpolation=cv2.INTER_LINEAR
+    )
+    return canvas, scale, (pad_x, pad_y)
+
+
+def to_tensor(images):
+    """BGR uint8 HWC images -> float32 NCHW RGB batch scaled to 0..1"""
+    batch = np.stack(images)[..., ::-1].transpose(0, 3, 1, 2)
+    return np.ascontiguousarray(batch, dtype=np.float32) / 255.0
+
+
+class UltralyticsDetector:
+    def __init__(self, path):
+        from ultralytics import YOLO
+
+        self.model = YOLO(path)
+
+    def detect_batch(self, images):
+        detections = []
+        for result in self.model(list(images), verbose=False):
+            detections.append(
+                (result.boxes.xyxy.cpu().numpy(), result.boxes.conf.cpu().numpy())
+            )
+        return detections
+
+
+class ExportedDetector:
+    """Shared pre/post-processing for YOLOv8 graphs exported without NMS"""
+
+    def _run(self, batch):
+        raise NotImplementedError
+
+    def detect_batch(self, images):
+        if not images:
+            return []
+        boxed = [letterbox(image) for image in images]
+        output = self._run(to_tensor([b[0] for b in boxed]))
+        return [
+            self._decode(prediction, scale, pad)
+            for prediction, (_, scale, pad) in zip(output, boxed)
+        ]
+
+    def _decode(self, prediction, scale, pad):
+        # prediction: (4 + classes, anchors) -> rows of cx, cy, w, h, class scores
+        rows = prediction.T
+        scores = rows[:, 4:].max(axis=1)
+        keep = scores > CONF_THRESHOLD
+        rows, scores = rows[keep], scores[keep]
+        if not len(rows):
+            return np.empty((0, 4), dtype=np.float32), np.empty(0, dtype=np.float32)
+
+        cx, cy, w, h = rows[:, 0], rows[:, 1], rows[:, 2], rows[:, 3]
+        xyxy = np.stack([cx - w / 2, cy - h / 2, cx + w / 2, cy + h / 2], axis=1)
+        xyxy -= np.tile(pad, 2)
+        xyxy /= scale
+
+        indices = cv2.dnn.NMSBoxes(
+            np.column_stack([xyxy[:, :2], xyxy[:, 2:] - xyxy[:, :2]]).tolist(),
+            scores.tolist(),
+            CONF_THRESHOLD,
+            IOU_THRESHOLD,
+        )
+        indices = np.array(indices, dtype=int).reshape(-1)
+        return xyxy[indices].astype(np.float32), scores[indices].astype(np.float32)
+
+
+class OnnxDetector(ExportedDetector):
+    def __init__(self, path):
+        import onnxruntime
+
+        options = onnxruntime.SessionOptions()
+        options.graph_optimization_level = (
+            onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+        )
+        self.session = onnxruntime.InferenceSession(
+            path, options, providers=["CPUExecutionProvider"]
+        )
+        self.input_name = self.session.get_inputs()[0].name
+
+    def _run(self, batch):
+        return self.session.run(None, {self.input_name: batch})[0]
+
+
+class OpenVinoDetector(ExportedDetector):
+    def __init__(self, path):
+        import openvino as ov
+
+        core = ov.Core()
+        self.model = core.compile_model(
+            core.read_model(path), "CPU", {"PERFORMANCE_HINT": "LATENCY"}
+        )
+
+    def _run(self, batch):
+        return self.model(batch)[self.model.output(0)]
+
+
+RUNTIMES = {
+    "pytorch": UltralyticsDetector,
+    "onnx": OnnxDetector,
+    "openvino": OpenVinoDetector,
+}
+
+
+def load_detector(runtime=None, path=None, warmup=True):
+    """Load the configured detector and run one warm-up inference"""
+    runtime = runtime or os.getenv("DETECTOR_RUNTIME", "pytorch")
+    path = path or os.getenv("DETECTOR_MODEL") or DEFAULT_MODELS[runtime]
+    started = time.perf_counter()
+    detector = RUNTIMES[runtime](path)
+    loaded = time.perf_counter()
+    if warmup:
+        detector.detect_batch([np.zeros((480, 640, 3), dtype=np.uint8)])
+    print(
+        f"[MODEL] {runtime} detector {path} loaded in {loaded - started:.1f}s, "
+        f"warm-up {(time.perf_counter() - loaded) * 1000:.0f} ms"
+    )
+    return detector
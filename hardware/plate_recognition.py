@@ -0,0 +1,165 @@
+"""
+Plate recognition shared by the entry and exit gates.
+
+    recognizer = PlateRecognizer()
+    for read in recognizer.recognize(frame):
+        if read.plate:
+            ...
+
+recognize() is detect() (YOLO, see plate_detector) followed by read_plates() (crop, preprocess,
+OCR, Rwandan-format validation); the pipeline runs the two halves on
+different threads. Crops are resized into preallocated buffers so the
+per-box preprocessing does not allocate, and crop images are only kept on
+the reads when a display wants to show them.
+"""
+import re
+from collections import namedtuple
+
+import cv2
+import numpy as np
+
+from metrics import stage
+from ocr import create_backend
+from plate_detector import load_detector
+
+# Preprocessed plate size; Rwandan plates are roughly 4.7:1
+PLATE_WIDTH = 300
+PLATE_HEIGHT = 64
+MAX_PLATES_PER_FRAME = 8
+
+# Rwandan format: RA + letter + 3 digits + letter, e.g. RAB123C
+PLATE_PATTERN = re.compile(r"RA[A-Z][0-9]{3}[A-Z]")
+PLATE_LENGTH = 7
+
+PlateRead = namedtuple(
+    "PlateRead",
+    ["plate", "text", "confidence", "box", "box_confidence", "crop", "processed"],
+)
+
+
+class Detections:
+    """Plate boxes (frame coordinates) and confidences detected in one frame"""
+
+    def __init__(self, image, xyxy, conf):
+        self.image = image
+        self.xyxy = xyxy
+        self.conf = conf
+
+    def __len__(self):
+        return len(self.conf)
+
+    def plot(self):
+        annotated = self.image.copy()
+        for (x1, y1, x2, y2), conf in zip(self.xyxy.astype(int), self.conf):
+            cv2.rectangle(annotated, (x1, y1), (x2, y2), (0, 255, 0), 2)
+            cv2.putText(
+                annotated,
+                f"plate {conf:.2f}",
+                (x1, max(y1 - 5, 0)),
+                cv2.FONT_HERSHEY_SIMPLEX,
+                0.5,
+                (0, 255, 0),
+                1,
+            )
+        return annotated
+
+
+def normalize_plate(text):
+    """Return the Rwandan plate contained in raw OCR text, or None"""
+    match = PLATE_PATTERN.search(text.upper())
+    return match.group(0) if match else None
+
+
+class PlateRecognizer:
+    def __init__(self, detector=None, ocr=None, keep_images=False):
+        self.detector = detector or load_detector()
+        self.ocr = ocr or create_backend()
+        self.keep_images = keep_images
+        self._gray = np.empty((PLATE_HEIGHT, PLATE_WIDTH), dtype=np.uint8)
+        self._blur = np.empty_like(self._gray)
+        self._processed = np.empty(
+            (MAX_PLATES_PER_FRAME, PLATE_HEIGHT, PLATE_WIDTH), dtype=np.uint8
+        )
+
+    def detect(self, image, bounds=None):
+        """Run YOLO on the frame, or only on the (x1, y1, x2, y2) region `bounds`"""
+        return self.detect_batch([image], [bounds])[0]
+
+    def detect_batch(self, images, bounds=None):
+        """One batched detector call for several frames; returns Detections per frame"""
+        inputs, offsets = [], []
+        for image, region in zip(images, bounds or [None] * len(images)):
+            if region is None:
+                inputs.append(image)
+                offsets.append((0, 0))
+            else:
+                x1, y1, x2, y2 = region
+                inputs.append(image[y1:y2, x1:x2])
+                offsets.append((x1, y1))
+        with stage("yolo"):
+            batch = self.detector.detect_batch(inputs)
+        detections = []
+        for image, offset, (xyxy, conf) in zip(images, offsets, batch):
+            detections.append(Detections(image, xyxy + np.tile(offset, 2), conf))
+        return detections
+
+    def boxes(self, image, detections):
+        """Integer (x1, y1, x2, y2) boxes clipped to the frame, degenerate ones dropped"""
+        if len(detections) == 0:
+            return np.empty((0, 4), dtype=int), np.empty(0)
+        height, width = image.shape[:2]
+        xyxy = detections.xyxy.copy()
+        xyxy[:, [0, 2]] = np.clip(xyxy[:, [0, 2]], 0, width)
+        xyxy[:, [1, 3]] = np.clip(xyxy[:, [1, 3]], 0, height)
+        xyxy = xyxy.astype(int)
+        keep = (xyxy[:, 2] > xyxy[:, 0]) & (xyxy[:, 3] > xyxy[:, 1])
+        conf = detections.conf
+        return xyxy[keep][:MAX_PLATES_PER_FRAME], conf[keep][:MAX_PLATES_PER_FRAME]
+
+    def preprocess(self, crop, out):
+        """Grayscale, blur and Otsu-threshold a BGR crop into `out`"""
+        resized = cv2.resize(crop, (PLATE_WIDTH, PLATE_HEIGHT))
+        cv2.cvtColor(resized, cv2.COLOR_BGR2GRAY, dst=self._gray)
+        cv2.GaussianBlur(self._gray, (5, 5), 0, dst=self._blur)
+        cv2.threshold(
+            self._blur, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU, dst=out
+        )
+        return out
+
+    def read_plates(self, image, results):
+        return self.read_boxes(image, *self.boxes(image, results))
+
+    def read_boxes(self, image, boxes, box_confidences):
+        """Crop, preprocess and OCR already-clipped boxes (see boxes())"""
+        if len(boxes) == 0:
+            return []
+        crops = [image[y1:y2, x1:x2] for x1, y1, x2, y2 in boxes]
+        with stage("preprocess"):
+            processed = [
+                self.preprocess(crop, self._processed[i]) for i, crop in enumerate(crops)
+            ]
+        with stage("ocr"):
+            ocr_reads = self.ocr.read_batch(processed)
+        reads = []
+        for box, box_confidence, crop, thresh, ocr_read in zip(
+            boxes, box_confidences, crops, processed, ocr_reads
+        ):
+            reads.append(
+                PlateRead(
+                    plate=normalize_plate(ocr_read.text),
+                    text=ocr_read.text,
+                    confidence=ocr_read.confidence,
+                    box=tuple(int(v) for v in box),
+                    box_confidence=float(box_confidence),
+                    # The buffers are reused next frame; copy only for display
+                    crop=crop.copy() if self.keep_images else None,
+                    processed=thresh.copy() if self.keep_images else None,
+                )
+            )
+        return reads
+
+    def recognize(self, image):
+        return self.read_plates(image, self.detect(image))
+
+    def close(self):
+        self.ocr.close()
@@ -0,0 +1,155 @@
+"""
+Per-vehicle plate tracking and voting.
+
+Detected boxes are associated with tracks across frames by IoU, so reads
+from different cars never mix. Each valid OCR read votes per character
+position, weighted by its OCR and detection confidence. A track's plate is
+final as soon as every position agrees strongly enough:
+
+    position score = winning weight / (total weight + PRIOR)
+    confidence     = lowest position score
+
+PRIOR stands for evidence not yet seen, so one read is never enough on its
+own and two confident agreeing reads usually are. If a track collects
+MAX_READS reads without reaching the threshold, its best guess is used, as
+the old fixed-size buffer did. Once final, a track needs no more OCR.
+
+The motion gate stops inferring once a car stands still, so a car whose
+reads while moving were blurry would never be decided. pending() reports
+live tracks that still need reads; the lanes keep running the detector on
+static frames while it is true, up to MAX_ATTEMPTS OCR reads per track.
+"""
+import itertools
+from collections import defaultdict
+
+from metrics import ocr_attempts
+from plate_recognition import PLATE_LENGTH
+
+IOU_THRESHOLD = 0.3
+MAX_AGE = 10.0  # seconds a track survives without being seen
+CONFIDENCE_THRESHOLD = 0.85
+PRIOR = 0.25
+MAX_READS = 5
+MIN_WEIGHT = 0.05  # backends that report no confidence still get a vote
+MAX_ATTEMPTS = 20  # OCR reads before an unreadable track stops asking for frames
+
+_track_ids = itertools.count(1)
+
+
+def iou(a, b):
+    x1, y1 = max(a[0], b[0]), max(a[1], b[1])
+    x2, y2 = min(a[2], b[2]), min(a[3], b[3])
+    inter = max(0, x2 - x1) * max(0, y2 - y1)
+    union = (a[2] - a[0]) * (a[3] - a[1]) + (b[2] - b[0]) * (b[3] - b[1]) - inter
+    return inter / union if union > 0 else 0.0
+
+
+class Track:
+    def __init__(self, box, now):
+        self.id = next(_track_ids)
+        self.box = box
+        self.last_seen = now
+        self.reads = 0
+        self.attempts = 0  # OCR reads, valid or not
+        self.plate = None  # set once final
+        self._votes = [defaultdict(float) for _ in range(PLATE_LENGTH)]
+
+    @property
+    def finalized(self):
+        return self.plate is not None
+
+    def best(self):
+        """(plate guess, confidence) from the votes so far"""
+        chars, scores = [], []
+        for votes in self._votes:
+            if not votes:
+                return None, 0.0
+            char, weight = max(votes.items(), key=lambda item: item[1])
+            chars.append(char)
+            scores.append(weight / (sum(votes.values()) + PRIOR))
+        return "".join(chars), min(scores)
+
+    def add(self, read):
+        """Vote with a PlateRead; returns the plate if this read finalized the track"""
+        if self.finalized:
+            return None
+        self.attempts += 1
+        if not read.plate:
+            return None
+        weight = max(read.confidence * read.box_confidence, MIN_WEIGHT)
+        for votes, char in zip(self._votes, read.plate):
+            votes[char] += weight
+        self.reads += 1
+
+        plate, confidence = self.best()
+        if confidence >= CONFIDENCE_THRESHOLD:
+            print(f"[TRACK {self.id}] {plate} confirmed ({confidence:.2f}, {self.reads} reads)")
+        elif self.reads >= MAX_READS:
+            print(f"[TRACK {self.id}] Weak consensus ({confidence:.2f}) for {plate} after {self.reads} reads")
+        else:
+            return None
+        self.plate = plate
+        ocr_attempts.observe(self.attempts)
+        return plate
+
+
+class PlateTracker:
+    def __init__(self, iou_threshold=IOU_THRESHOLD, max_age=MAX_AGE):
+        self.iou_threshold = iou_threshold
+        self.max_age = max_age
+        self.tracks = []
+
+    def assign(self, boxes, now):
+        """Return the Track for each box, creating tracks for unmatched boxes"""
+        self.tracks = [t for t in self.tracks if now - t.last_seen <= self.max_age]
+        pairs = sorted(
+            (
+                (iou(tuple(box), track.box), i, track)
+                for i, box in enumerate(boxes)
+                for track in self.tracks
+            ),
+            key=lambda pair: pair[0],
+            reverse=True,
+        )
+        assigned, used = {}, set()
+        for overlap, i, track in pairs:
+            if overlap < self.iou_threshold:
+                break
+            if i in assigned or track.id in used:
+                continue
+            assigned[i] = track
+            used.add(track.id)
+
+        result = []
+        for i, box in enumerate(boxes):
+            box = tuple(int(v) for v in box)
+            track = assigned.get(i)
+            if track is None:
+                track = Track(box, now)
+                self.tracks.append(track)
+            track.box = box
+            track.last_seen = now
+            result.append(track)
+        return result
+
+    def pending(self, now):
+        """True while a live track still needs reads"""
+        return any(
+            not track.finalized
+            and track.attempts < MAX_ATTEMPTS
+            and now - track.last_seen <= self.max_age
+            for track in self.tracks
+        )
+
+    def read(self, recognizer, image, detections, now):
+        """OCR only boxes whose track is not final; returns (reads, newly final plates)"""
+        boxes, confidences = recognizer.boxes(image, detections)
+        tracks = self.assign(boxes, now)
+        pending = [i for i, track in enumerate(tracks) if not track.finalized]
+        reads = recognizer.read_boxes(image, boxes[pending], confidences[pending])
+        plates = []
+        for i, read in zip(pending, reads):
+            plate = tracks[i].add(read)
+            if plate:
+                plates.append(plate)
+        return reads, plates
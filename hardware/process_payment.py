@@ -1,177 +1,196 @@
-import serial
+"""
+RFID payment service for one or more terminals.
+
+    python process_payment.py                                  # auto-detect one terminal
+    python process_payment.py --port /dev/ttyACM0 --port /dev/ttyACM1
+
+Each terminal gets its own serial transport and worker thread, so terminals
+never wait on each other. A payment holds no database connection or
+transaction while the terminal talks to the card:
+
+    1. reserve   lock the entry (SKIP LOCKED), compute the fee in SQL and
+                 record a RESERVED row in the payments ledger
+    2. card      READY -> new balance -> DONE on the terminal
+    3. complete  mark the payment and the entry paid
+
+Retried taps are idempotent; see database/migrations/005_payment_ledger.sql.
+
+PAYMENT_PORTS (comma-separated) can replace the --port options.
+"""
+import argparse
+import os
+import threading
 import time
-import serial.tools.list_ports
-import platform
 from datetime import datetime
 import psycopg2
 from psycopg2.extras import DictCursor
+from db_pool import get_db_connection, init_pool
+from serial_transport import CARD, DONE, INSUFFICIENT, READY, SerialTransport
 
 # Configuration
 RATE_PER_HOUR = 500  # Amount charged per hour
-DB_CONFIG = {
-    "dbname": "parking_system",
-    "user": "jodos",
-    "password": "jodos",
-    "host": "localhost",
-    "port": "5432"
-}
-
-def get_db_connection():
-    return psycopg2.connect(**DB_CONFIG)
-
-def detect_arduino_port():
-    ports = list(serial.tools.list_ports.comports())
-    system = platform.system()
-    for port in ports:
-        if system == "Linux":
-            if "ttyUSB" in port.device or "ttyACM" in port.device:
-                return port.device
-        elif system == "Darwin":
-            if "usbmodem" in port.device or "usbserial" in port.device:
-                return port.device
-        elif system == "Windows":
-            if "COM" in port.device:
-                return port.device
-    return None
-
-def parse_arduino_data(line):
-    try:
-        parts = line.strip().split(",")
-        print(f"[ARDUINO] Parsed parts: {parts}")
-        if len(parts) != 2:
-            return None, None
-        plate = parts[0].strip()
-
-        # Clean the balance string by removing non-digit characters
-        balance_str = "".join(c for c in parts[1] if c.isdigit())
-        print(f"[ARDUINO] Cleaned balance: {balance_str}")
-
-        if balance_str:
-            balance = int(balance_str)
-            return plate, balance
-        else:
-            return None, None
-    except ValueError as e:
-        print(f"[ERROR] Value error in parsing: {e}")
-        return None, None
-
-def process_payment(plate, balance, ser):
+READY_TIMEOUT = 5  # seconds
+DONE_TIMEOUT = 10  # seconds
+FINALIZE_ATTEMPTS = 3
+RESERVATION_TTL = 60  # seconds before an unconfirmed reservation may be replaced
+
+
+def reserve(plate, balance, terminal_name, now):
+    """
+    Lock the plate's unpaid entry, compute the fee in SQL and record a
+    reservation (see reserve_payment() in database/migrations/005_payment_ledger.sql).
+    Returns the row: outcome, payment_id, entry_id, amount.
+    """
+    with get_db_connection() as conn:
+        with conn.cursor(cursor_factory=DictCursor) as cur:
+            cur.execute(
+                """
+                SELECT outcome, payment_id, entry_id, amount
+                FROM reserve_payment(%s, %s, %s, %s, %s, %s * INTERVAL '1 second')
+                """,
+                (plate, balance, terminal_name, now, RATE_PER_HOUR, RESERVATION_TTL),
+            )
+            return cur.fetchone()
+
+
+def complete(payment_id):
+    with get_db_connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute("SELECT complete_payment(%s, %s)", (payment_id, datetime.now()))
+            return cur.fetchone()[0]
+
+
+def fail(payment_id):
+    """Give up a reservation the terminal never confirmed"""
     try:
         with get_db_connection() as conn:
-            with conn.cursor(cursor_factory=DictCursor) as cur:
-                # Find unpaid entry for the plate
-                cur.execute("""
-                    SELECT id, entry_time
-                    FROM parking_entries
-                    WHERE car_plate = %s AND payment_status = FALSE
-                    ORDER BY entry_time DESC
-                    LIMIT 1
-                """, (plate,))
-                
-                entry = cur.fetchone()
-                
-                if not entry:
-                    print("[PAYMENT] Plate not found or already paid.")
-                    return
-
-                entry_time = entry['entry_time']
-                exit_time = datetime.now()
-
-                # Calculate total seconds spent and convert to hours (rounded up)
-                seconds_spent = (exit_time - entry_time).total_seconds()
-                hours_spent = int(seconds_spent / 3600) + (1 if seconds_spent % 3600 > 0 else 0)
-                amount_due = hours_spent * RATE_PER_HOUR  # Total fee
-
-                if balance < amount_due:
-                    print("[PAYMENT] Insufficient balance")
-                    ser.write(b"I\n")  # Signal "Insufficient balance" to Arduino
-                    return
-
-                # Wait for Arduino to send "READY"
-                print("[WAIT] Waiting for Arduino to be READY...")
-                start_time = time.time()
-                while True:
-                    if ser.in_waiting:
-                        arduino_response = ser.readline().decode().strip()
-                        print(f"[ARDUINO] {arduino_response}")
-                        if arduino_response == "READY":
-                            break
-                    if time.time() - start_time > 5:
-                        print("[ERROR] Timeout waiting for Arduino READY")
-                        return
-
-                # Calculate new balance and send to Arduino
-                new_balance = balance - amount_due
-                ser.write(f"{new_balance}\r\n".encode())
-                print(f"[PAYMENT] Sent new balance: {new_balance} RWF")
-
-                # Wait for confirmation
-                start_time = time.time()
-                payment_confirmed = False
-                while True:
-                    if ser.in_waiting:
-                        confirm = ser.readline().decode().strip()
-                        print(f"[ARDUINO] {confirm}")
-                        if "DONE" in confirm:
-                            print("[PAYMENT] Payment confirmed!")
-                            payment_confirmed = True
-                            break
-                    if time.time() - start_time > 10:
-                        print("[ERROR] Timeout waiting for confirmation")
-                        break
-                    time.sleep(0.1)
-
-                if payment_confirmed:
-                    # Update the database record
-                    cur.execute("""
-                        UPDATE parking_entries
-                        SET exit_time = %s,
-                            due_payment = %s,
-                            payment_status = TRUE
-                        WHERE id = %s
-                    """, (exit_time, amount_due, entry['id']))
-                    conn.commit()
-                    print(f"[DATABASE] Updated payment record for plate {plate}")
-
+            with conn.cursor() as cur:
+                cur.execute(
+                    "UPDATE payments SET status = 'FAILED' WHERE id = %s AND status = 'RESERVED'",
+                    (payment_id,),
+                )
+    except psycopg2.Error as e:
+        # The reservation expires by itself after RESERVATION_TTL
+        print(f"[DATABASE ERROR] Releasing payment #{payment_id}: {e}")
+
+
+def complete_with_retries(payment_id, plate, amount):
+    # The card is already debited; try hard to record it
+    for attempt in range(1, FINALIZE_ATTEMPTS + 1):
+        try:
+            complete(payment_id)
+            print(f"[DATABASE] Updated payment record for plate {plate}")
+            return True
+        except psycopg2.Error as e:
+            print(f"[DATABASE ERROR] Completing payment #{payment_id} (attempt {attempt}): {e}")
+            time.sleep(attempt)
+    # A later tap of the same card completes it (see reserve_payment)
+    print(f"[PAYMENT ERROR] Card charged {amount} RWF for {plate} but payment #{payment_id} is not recorded")
+    return False
+
+
+def process_payment(plate, balance, terminal, card):
+    try:
+        result = reserve(plate, balance, terminal.name, datetime.now())
     except psycopg2.Error as e:
         print(f"[DATABASE ERROR] {e}")
-        conn.rollback()
-    except Exception as e:
-        print(f"[ERROR] Payment processing failed: {e}")
+        return
+    outcome, payment_id, amount = result["outcome"], result["payment_id"], result["amount"]
 
-def main():
-    port = detect_arduino_port()
-    if not port:
-        print("[ERROR] Arduino not found")
+    if outcome == "NOT_FOUND":
+        print(f"[PAYMENT] {plate}: plate not found or already paid.")
+        return
+    if outcome == "BUSY":
+        print(f"[PAYMENT] {plate}: already being paid at another terminal")
+        return
+    if outcome == "INSUFFICIENT":
+        print(f"[PAYMENT] {plate}: insufficient balance ({balance} < {amount} RWF)")
+        terminal.send(INSUFFICIENT)  # Signal "Insufficient balance" to Arduino
         return
 
-    try:
-        # Test database connection
-        with get_db_connection() as conn:
-            print("[DATABASE] Successfully connected to PostgreSQL")
+    # Wait for Arduino to send "READY" (it may already have, right after the card)
+    if terminal.wait_for(READY, timeout=READY_TIMEOUT, after=card.seq) is None:
+        print(f"[ERROR] {terminal.name}: timeout waiting for READY")
+        if outcome == "RESERVED":
+            fail(payment_id)
+        return
 
-        ser = serial.Serial(port, 9600, timeout=1)
-        print(f"[CONNECTED] Listening on {port}")
-        time.sleep(2)
+    if outcome == "ALREADY_CHARGED":
+        # An earlier tap reached the card but was never confirmed; the card
+        # keeps its balance and the payment is now recorded
+        print(f"[PAYMENT] {plate}: earlier charge of {amount} RWF confirmed by the card balance")
+        terminal.request(balance, DONE, timeout=DONE_TIMEOUT)
+        return
 
-        # Flush any previous data
-        ser.reset_input_buffer()
+    # Send the new balance and wait for the card write
+    new_balance = balance - amount
+    print(f"[PAYMENT] {plate}: sending new balance {new_balance} RWF")
+    if terminal.request(new_balance, DONE, timeout=DONE_TIMEOUT) is None:
+        # The card may still have been written; the next tap settles it
+        print(f"[ERROR] {terminal.name}: timeout waiting for confirmation")
+        fail(payment_id)
+        return
+    print(f"[PAYMENT] {plate}: payment confirmed!")
+    complete_with_retries(payment_id, plate, amount)
+
+
+def serve(terminal, stopping):
+    """Process card reads from one terminal until `stopping` is set"""
+    last_seq = 0
+    while not stopping.is_set():
+        # Blocks on the reader thread's event; no polling
+        card = terminal.wait_for(CARD, timeout=1, after=last_seq)
+        if card is None:
+            continue
+        last_seq = card.seq
+        plate, balance = card.value
+        print(f"[SERIAL] {terminal.name}: card read {plate}, balance {balance}")
+        try:
+            process_payment(plate, balance, terminal, card)
+        except Exception as e:
+            print(f"[ERROR] Payment processing failed: {e}")
 
-        while True:
-            if ser.in_waiting:
-                line = ser.readline().decode().strip()
-                print(f"[SERIAL] Received: {line}")
-                plate, balance = parse_arduino_data(line)
-                if plate and balance is not None:
-                    process_payment(plate, balance, ser)
 
+def main():
+    parser = argparse.ArgumentParser(description="RFID payment service")
+    parser.add_argument(
+        "--port",
+        action="append",
+        help="terminal serial port, repeatable (default: PAYMENT_PORTS, else auto-detect one)",
+    )
+    args = parser.parse_args()
+    ports = args.port or [p for p in os.getenv("PAYMENT_PORTS", "").split(",") if p] or [None]
+
+    try:
+        # Open the pool up front; this also tests the database connection
+        init_pool()
+        print("[DATABASE] Successfully connected to PostgreSQL")
+    except psycopg2.Error as e:
+        print(f"[DATABASE ERROR] {e}")
+        return
+
+    stopping = threading.Event()
+    terminals, workers = [], []
+    for i, port in enumerate(ports, start=1):
+        terminal = SerialTransport(port, name=f"Payment terminal {i}").start()
+        worker = threading.Thread(
+            target=serve, args=(terminal, stopping), name=f"payment-{i}", daemon=True
+        )
+        worker.start()
+        terminals.append(terminal)
+        workers.append(worker)
+
+    try:
+        while any(worker.is_alive() for worker in workers):
+            time.sleep(1)
     except KeyboardInterrupt:
         print("[EXIT] Program terminated")
-    except Exception as e:
-        print(f"[ERROR] {e}")
     finally:
-        if 'ser' in locals():
-            ser.close()
+        stopping.set()
+        for worker in workers:
+            worker.join(timeout=2)
+        for terminal in terminals:
+            terminal.stop()
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,256 @@
+"""
+Event-driven serial link to a gate or payment Arduino.
+
+A reader thread blocks on the port and splits the input into lines. Each
+line is parsed into a typed Message:
+
+    DISTANCE  ultrasonic reading in cm ("42.5")
+    CARD      RFID card read, value (plate, balance) ("RAB123C,4500")
+    READY     payment terminal waiting for the new balance
+    DONE      payment terminal wrote the new balance to the card
+    LOG       anything else (debug output, printed as [ARDUINO])
+
+Callers never poll the port. They read the latest distance, subscribe to a
+message kind, or wait for the next message of some kinds with a timeout.
+request() sends a command and waits for its reply. INSUFFICIENT ("I") and
+balance updates are the commands the payment terminal understands; the
+gate sketches take the single bytes in gate_controller.
+
+If the USB device disappears, the transport closes the port and keeps
+trying to reopen it (re-detecting the port when none was configured, since
+the device may come back under another name). Writes made while
+disconnected are dropped with a warning.
+"""
+import platform
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import Future
+
+import serial
+import serial.tools.list_ports
+
+BAUD_RATE = 9600
+RESET_DELAY = 2  # seconds; opening the port resets the Arduino
+RECONNECT_INTERVAL = 2  # seconds between reopen attempts
+DISTANCE_MAX_AGE = 1.0  # seconds a distance reading stays current
+
+DISTANCE = "DISTANCE"
+CARD = "CARD"
+READY = "READY"
+DONE = "DONE"
+LOG = "LOG"
+
+INSUFFICIENT = "I"
+
+Message = namedtuple("Message", ["seq", "kind", "value", "raw", "received"])
+
+
+def detect_arduino_port():
+    for port in serial.tools.list_ports.comports():
+        dev = port.device
+        if platform.system() == "Linux" and ("ttyACM" in dev or "ttyUSB" in dev):
+            return dev
+        if platform.system() == "Darwin" and ("usbmodem" in dev or "usbserial" in dev):
+            return dev
+        if platform.system() == "Windows" and "COM" in dev:
+            return dev
+    return None
+
+
+def parse_card(line):
+    """'PLATE,balance' -> (plate, balance), or None"""
+    parts = line.split(",")
+    if len(parts) != 2 or line.startswith("["):
+        return None
+    plate = parts[0].strip()
+    # The balance block is padded on the card; keep the digits only
+    balance = "".join(c for c in parts[1] if c.isdigit())
+    if not plate or not balance:
+        return None
+    return plate, int(balance)
+
+
+def parse_line(line):
+    """Returns (kind, value) for one line of Arduino output"""
+    if line in (READY, DONE):
+        return line, None
+    try:
+        return DISTANCE, float(line)
+    except ValueError:
+        pass
+    card = parse_card(line)
+    if card:
+        return CARD, card
+    return LOG, line
+
+
+class SerialTransport:
+    def __init__(self, port=None, baudrate=BAUD_RATE, name="Arduino"):
+        self.port = port  # None: auto-detect
+        self.baudrate = baudrate
+        self.name = name
+        self._serial = None
+        self._write_lock = threading.Lock()
+        self._lock = threading.Lock()
+        self._seq = 0
+        self._latest = {}  # kind -> Message
+        self._waiters = []  # (kinds, after, future)
+        self._subscribers = {}  # kind -> [callback]
+        self._stopping = threading.Event()
+        self._thread = threading.Thread(target=self._run, name=f"serial-{name}", daemon=True)
+
+    @property
+    def connected(self):
+        return self._serial is not None
+
+    def start(self):
+        if not self._open():
+            print(f"[ERROR] {self.name} not detected, retrying in the background")
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stopping.set()
+        self._thread.join(timeout=2)
+        self._close()
+
+    # Alias so the transport can stand in for a serial.Serial
+    close = stop
+
+    # ===== Sending =====
+
+    def write(self, data):
+        with self._write_lock:
+            if self._serial is None:
+                print(f"[SERIAL] {self.name} disconnected, dropped {data!r}")
+                return False
+            try:
+                self._serial.write(data)
+                return True
+            except (serial.SerialException, OSError) as e:
+                print(f"[SERIAL] {self.name} write failed: {e}")
+                self._close()
+                return False
+
+    def send(self, text):
+        return self.write(f"{text}\r\n".encode())
+
+    def request(self, text, kinds, timeout):
+        """Send a command and wait for the next message of `kinds`; None on timeout"""
+        future = self.expect(kinds)
+        if not self.send(text):
+            self._discard(future)
+            return None
+        return self._result(future, timeout)
+
+    # ===== Receiving =====
+
+    def distance(self, max_age=DISTANCE_MAX_AGE):
+        """The latest distance reading in cm, or None if there is no recent one"""
+        message = self._latest.get(DISTANCE)
+        if message is None or time.monotonic() - message.received > max_age:
+            return None
+        return message.value
+
+    def subscribe(self, kind, callback):
+        """Call `callback(message)` on the reader thread for every message of `kind`"""
+        with self._lock:
+            self._subscribers.setdefault(kind, []).append(callback)
+
+    def expect(self, kinds, after=None):
+        """
+        Future for the first message of `kinds` with a sequence number above
+        `after` (default: anything received from now on). Passing the seq of
+        a message already handled closes the gap between two waits.
+        """
+        kinds = (kinds,) if isinstance(kinds, str) else tuple(kinds)
+        future = Future()
+        with self._lock:
+            after = self._seq if after is None else after
+            for kind in kinds:
+                message = self._latest.get(kind)
+                if message and message.seq > after:
+                    future.set_result(message)
+                    return future
+            self._waiters.append((kinds, after, future))
+        return future
+
+    def wait_for(self, kinds, timeout=None, after=None):
+        """Next message of `kinds` (see expect), or None on timeout"""
+        return self._result(self.expect(kinds, after), timeout)
+
+    def _result(self, future, timeout):
+        try:
+            return future.result(timeout)
+        except TimeoutError:
+            self._discard(future)
+            return None
+
+    def _discard(self, future):
+        with self._lock:
+            self._waiters = [w for w in self._waiters if w[2] is not future]
+
+    def _dispatch(self, line):
+        kind, value = parse_line(line)
+        with self._lock:
+            self._seq += 1
+            message = Message(self._seq, kind, value, line, time.monotonic())
+            self._latest[kind] = message
+            ready = [w for w in self._waiters if kind in w[0] and message.seq > w[1]]
+            self._waiters = [w for w in self._waiters if w not in ready]
+            callbacks = list(self._subscribers.get(kind, ()))
+        for _, _, future in ready:
+            future.set_result(message)
+        if kind == LOG:
+            print(f"[ARDUINO] {line}")
+        for callback in callbacks:
+            try:
+                callback(message)
+            except Exception as e:
+                print(f"[SERIAL] {self.name} {kind} handler failed: {e}")
+
+    # ===== Connection =====
+
+    def _open(self):
+        port = self.port or detect_arduino_port()
+        if not port:
+            return False
+        try:
+            connection = serial.Serial(port, self.baudrate, timeout=1)
+            time.sleep(RESET_DELAY)
+            connection.reset_input_buffer()
+        except (serial.SerialException, OSError):
+            return False
+        with self._write_lock:
+            self._serial = connection
+        print(f"[CONNECTED] {self.name} on {port}")
+        return True
+
+    def _close(self):
+        with self._write_lock:
+            connection, self._serial = self._serial, None
+        if connection is not None:
+            try:
+                connection.close()
+            except (serial.SerialException, OSError):
+                pass
+
+    def _run(self):
+        while not self._stopping.is_set():
+            connection = self._serial
+            if connection is None:
+                if not self._open():
+                    self._stopping.wait(RECONNECT_INTERVAL)
+                continue
+            try:
+                raw = connection.readline()
+            except (serial.SerialException, OSError, TypeError) as e:
+                # TypeError: pyserial's read on a port closed under it
+                if not self._stopping.is_set():
+                    print(f"[SERIAL] {self.name} lost: {e}; reconnecting")
+                self._close()
+                continue
+            line = raw.decode("utf-8", errors="replace").strip()
+            if line:
+                self._dispatch(line)
@@ -0,0 +1,108 @@
+"""
+Low-rate remote view for headless gates.
+
+    GET /snapshot.jpg  latest camera frame as a JPEG
+    GET /stream.mjpg   MJPEG stream capped at `fps`
+
+Frames are only JPEG-encoded when a client is connected, and each frame is
+encoded once however many clients watch it.
+"""
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import cv2
+
+JPEG_QUALITY = 70
+BOUNDARY = "frame"
+
+
+class SnapshotServer:
+    """`get_frame()` returns the latest pipeline Frame (seq, timestamp, image) or None"""
+
+    def __init__(self, get_frame, port, fps=1.0, host="0.0.0.0"):
+        self.get_frame = get_frame
+        self.fps = fps
+        self._lock = threading.Lock()
+        self._cached = (None, None)  # (seq, jpeg bytes)
+        self._server = ThreadingHTTPServer((host, port), self._handler())
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(
+            target=self._server.serve_forever, name="snapshot", daemon=True
+        )
+
+    def start(self):
+        self._thread.start()
+        host, port = self._server.server_address
+        print(f"[SNAPSHOT] Serving http://{host}:{port}/snapshot.jpg and /stream.mjpg")
+        return self
+
+    def stop(self):
+        if self._thread.is_alive():
+            self._server.shutdown()
+        self._server.server_close()
+
+    def jpeg(self):
+        frame = self.get_frame()
+        if frame is None:
+            return None
+        with self._lock:
+            seq, data = self._cached
+            if seq != frame.seq:
+                ok, encoded = cv2.imencode(
+                    ".jpg", frame.image, [cv2.IMWRITE_JPEG_QUALITY, JPEG_QUALITY]
+                )
+                if not ok:
+                    return None
+                data = encoded.tobytes()
+                self._cached = (frame.seq, data)
+            return data
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                if self.path == "/snapshot.jpg":
+                    self._snapshot()
+                elif self.path == "/stream.mjpg":
+                    self._stream()
+                else:
+                    self.send_error(404)
+
+            def _snapshot(self):
+                data = server.jpeg()
+                if data is None:
+                    self.send_error(503, "No frame yet")
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", "image/jpeg")
+                self.send_header("Content-Length", str(len(data)))
+                self.send_header("Cache-Control", "no-store")
+                self.end_headers()
+                self.wfile.write(data)
+
+            def _stream(self):
+                self.send_response(200)
+                self.send_header(
+                    "Content-Type", f"multipart/x-mixed-replace; boundary={BOUNDARY}"
+                )
+                self.send_header("Cache-Control", "no-store")
+                self.end_headers()
+                try:
+                    while True:
+                        data = server.jpeg()
+                        if data is not None:
+                            self.wfile.write(
+                                f"--{BOUNDARY}\r\nContent-Type: image/jpeg\r\n"
+                                f"Content-Length: {len(data)}\r\n\r\n".encode()
+                            )
+                            self.wfile.write(data + b"\r\n")
+                        time.sleep(1.0 / server.fps)
+                except (BrokenPipeError, ConnectionResetError):
+                    pass
+
+        return Handler
@@ -0,0 +1,165 @@
+"""
+Run several entry and exit lanes from one process.
+
+    python supervisor.py lanes.json
+
+Every lane in the configuration (see lanes.example.json) maps a camera to an
+Arduino serial port and a role. Lanes keep their own capture thread, motion
+gate, gate controller and decision worker, but share one loaded model and
+one OCR engine. Lanes submit frames to an InferenceService, which batches
+them across lanes under the latency budget set in the file's optional
+"inference" section (max_batch_size, max_wait_ms, latency_budget_ms).
+"""
+import argparse
+import json
+import time
+
+import cv2
+
+from car_entry import EntryLane
+from car_exit import ExitLane
+from db_pool import init_pool
+from decision_cache import recent_decisions
+from frame_pipeline import FramePipeline
+from gate_controller import GateController
+from incident_writer import incidents
+from inference_service import InferenceService
+from local_state import local_state
+from metrics import start_server
+from motion_gate import MotionGate, parse_roi
+from plate_recognition import PlateRecognizer
+from serial_transport import SerialTransport
+from snapshot_server import SnapshotServer
+
+LANE_ROLES = {"entry": EntryLane, "exit": ExitLane}
+STATS_INTERVAL = 60  # seconds
+
+
+def load_config(path):
+    """Returns (lane configs, InferenceService keyword arguments)"""
+    with open(path) as f:
+        config = json.load(f)
+    lanes = config["lanes"]
+    names = set()
+    for lane in lanes:
+        if lane.get("role") not in LANE_ROLES:
+            raise ValueError(f"Lane {lane.get('name')}: role must be entry or exit")
+        if lane["name"] in names:
+            raise ValueError(f"Duplicate lane name: {lane['name']}")
+        names.add(lane["name"])
+        parse_roi(lane.get("roi"))
+
+    inference = config.get("inference", {})
+    options = {}
+    if "max_batch_size" in inference:
+        options["max_batch_size"] = int(inference["max_batch_size"])
+    if "max_wait_ms" in inference:
+        options["max_wait"] = inference["max_wait_ms"] / 1000
+    if "latency_budget_ms" in inference:
+        options["latency_budget"] = inference["latency_budget_ms"] / 1000
+    return lanes, options
+
+
+class Lane:
+    def __init__(self, config, shared, inference):
+        self.name = config["name"]
+        self.arduino = open_serial(self.name, config.get("serial_port"))
+        self.gate = GateController(self.arduino).start()
+        self.pipeline = None
+        self.snapshots = None
+        self.cap = cv2.VideoCapture(config["camera"])
+        if not self.cap.isOpened():
+            self.close()
+            raise RuntimeError(f"Lane {self.name}: cannot open camera {config['camera']}")
+
+        motion = MotionGate(parse_roi(config.get("roi")))
+        self.handler = LANE_ROLES[config["role"]](self.gate, self.arduino, motion)
+        # Own preprocessing buffers, shared model and OCR engine
+        reader = PlateRecognizer(detector=shared.detector, ocr=shared.ocr)
+        self.pipeline = FramePipeline(
+            self.cap,
+            infer=lambda image: inference.infer(
+                self.name, image, motion.roi_bounds(image)
+            ),
+            decide=lambda frame, results: self.handler.process(reader, frame, results),
+            should_infer=self.handler.should_infer,
+        )
+        if config.get("snapshot_port"):
+            self.snapshots = SnapshotServer(
+                lambda: self.pipeline.latest[0] if self.pipeline.latest else None,
+                config["snapshot_port"],
+            )
+
+    def start(self):
+        self.pipeline.start()
+        if self.snapshots:
+            self.snapshots.start()
+        print(f"[LANE {self.name}] Running")
+
+    def close(self):
+        if self.pipeline:
+            self.pipeline.stop()
+        if self.snapshots:
+            self.snapshots.stop()
+        self.gate.stop()
+        self.cap.release()
+        if self.arduino:
+            self.arduino.close()
+
+
+def open_serial(lane_name, port):
+    """SerialTransport for the lane's port ("auto": detect), or None without one"""
+    if not port:
+        print(f"[LANE {lane_name}] No Arduino configured, running without sensors")
+        return None
+    return SerialTransport(
+        None if port == "auto" else port, name=f"lane {lane_name} Arduino"
+    ).start()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Multi-lane gate supervisor")
+    parser.add_argument("config", help="lane configuration file (JSON)")
+    args = parser.parse_args()
+    lane_configs, inference_options = load_config(args.config)
+
+    try:
+        init_pool()
+    except Exception as e:
+        print(f"[DATABASE ERROR] Could not open connection pool: {e}")
+    incidents.start()
+    local_state.start()
+    start_server()
+
+    # Load YOLOv8 model and OCR engine once for all lanes
+    shared = PlateRecognizer()
+    inference = InferenceService(shared.detect_batch, **inference_options).start()
+    lanes = []
+    try:
+        for config in lane_configs:
+            lanes.append(Lane(config, shared, inference))
+        for lane in lanes:
+            lane.start()
+
+        last_stats = time.monotonic()
+        while any(lane.pipeline.running for lane in lanes):
+            time.sleep(1)
+            if time.monotonic() - last_stats >= STATS_INTERVAL:
+                last_stats = time.monotonic()
+                for lane in lanes:
+                    print(f"[LANE {lane.name}] {lane.pipeline.stats()}")
+                print(f"[INFERENCE] {inference.stats()}")
+                print(f"[CACHE] {recent_decisions.stats()}")
+    except KeyboardInterrupt:
+        print("[EXIT] Program terminated")
+    finally:
+        for lane in lanes:
+            lane.close()
+        inference.stop()
+        local_state.stop()
+        incidents.stop()
+        shared.close()
+
+
+if __name__ == "__main__":
+    main()
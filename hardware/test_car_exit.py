@@ -0,0 +1,40 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+pytest.importorskip("psycopg2")
+
+from car_exit import EXIT_TIME_WINDOW, decide_exit
+
+NOW = datetime(2026, 1, 1, 12, 0)
+
+
+def state(has_entry=True, unpaid_entry_id=None, last_paid_exit=None):
+    return {
+        "has_entry": has_entry,
+        "unpaid_entry_id": unpaid_entry_id,
+        "last_paid_exit": last_paid_exit,
+    }
+
+
+def test_plate_never_entered():
+    assert decide_exit(state(has_entry=False), NOW) == "NO_ENTRY"
+
+
+def test_unpaid_entry_is_unauthorized_even_after_a_paid_exit():
+    recent = NOW - timedelta(minutes=1)
+    assert decide_exit(state(unpaid_entry_id=7, last_paid_exit=recent), NOW) == "UNAUTHORIZED"
+
+
+def test_paid_within_window_is_granted():
+    paid = NOW - timedelta(minutes=EXIT_TIME_WINDOW) + timedelta(seconds=1)
+    assert decide_exit(state(last_paid_exit=paid), NOW) == "GRANTED"
+
+
+def test_paid_exit_outside_window_is_denied():
+    paid = NOW - timedelta(minutes=EXIT_TIME_WINDOW)
+    assert decide_exit(state(last_paid_exit=paid), NOW) == "DENIED"
+
+
+def test_entry_without_paid_exit_is_denied():
+    assert decide_exit(state(), NOW) == "DENIED"
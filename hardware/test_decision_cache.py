@@ -0,0 +1,66 @@
+import pytest
+
+import decision_cache
+from decision_cache import DecisionCache
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(decision_cache, "time", clock)
+    return clock
+
+
+def test_entry_expires_after_ttl(clock):
+    cache = DecisionCache(ttl=10)
+    cache.put(("entry", "RAB123C"), "ADMITTED")
+    clock.now += 4
+    assert cache.get(("entry", "RAB123C")) == ("ADMITTED", 4)
+    clock.now += 6
+    assert cache.get(("entry", "RAB123C")) is None
+    assert cache.stats() == {"size": 0, "hits": 1, "misses": 1}
+
+
+def test_put_ttl_overrides_default(clock):
+    cache = DecisionCache(ttl=300)
+    cache.put(("entry", "RAB123C"), "ADMITTED", ttl=20)
+    cache.put(("entry", "RAC456D"), "DOUBLE_ENTRY")
+    clock.now += 21
+    assert cache.get(("entry", "RAB123C")) is None
+    assert cache.get(("entry", "RAC456D"))[0] == "DOUBLE_ENTRY"
+
+
+def test_least_recently_used_is_evicted(clock):
+    cache = DecisionCache(max_size=2)
+    cache.put(("exit", "A"), "GRANTED")
+    cache.put(("exit", "B"), "DENIED")
+    # Reading A makes B the least recently used
+    assert cache.get(("exit", "A"))
+    cache.put(("exit", "C"), "GRANTED")
+    assert cache.get(("exit", "B")) is None
+    assert cache.get(("exit", "A")) and cache.get(("exit", "C"))
+
+
+def test_put_replaces_and_refreshes(clock):
+    cache = DecisionCache(ttl=10)
+    cache.put(("exit", "A"), "DENIED")
+    clock.now += 8
+    cache.put(("exit", "A"), "GRANTED")
+    clock.now += 8
+    assert cache.get(("exit", "A")) == ("GRANTED", 8)
+
+
+def test_discard_forgets_decision(clock):
+    cache = DecisionCache()
+    cache.put(("entry", "A"), "ADMITTED")
+    cache.discard(("entry", "A"))
+    cache.discard(("entry", "missing"))
+    assert cache.get(("entry", "A")) is None
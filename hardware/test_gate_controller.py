@@ -0,0 +1,91 @@
+import threading
+import time
+
+from gate_controller import CLOSE, OPEN, GateController
+
+
+class FakeArduino:
+    def __init__(self):
+        self.writes = []
+        self.lock = threading.Lock()
+
+    def write(self, command):
+        with self.lock:
+            self.writes.append(command)
+
+
+def wait_until(predicate, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.01)
+    return False
+
+
+def make_gate():
+    arduino = FakeArduino()
+    return GateController(arduino).start(), arduino
+
+
+def test_open_pre_empts_running_alarm():
+    gate, arduino = make_gate()
+    try:
+        assert gate.alarm("DENIED")
+        time.sleep(0.05)
+        assert gate.open_gate(0.3)
+        assert gate.active == "OPEN"
+        # Held open, then closed once, with no alarm steps in between
+        assert wait_until(lambda: gate.active is None)
+        opened = len(arduino.writes) - 1 - arduino.writes[::-1].index(OPEN)
+        assert arduino.writes[opened:] == [OPEN, CLOSE]
+    finally:
+        gate.stop()
+
+
+def test_alarm_is_deferred_until_barrier_closes():
+    gate, arduino = make_gate()
+    try:
+        assert gate.open_gate(0.2)
+        assert not gate.alarm("UNAUTHORIZED")
+        assert gate.active == "OPEN"
+        assert wait_until(lambda: gate.active == "UNAUTHORIZED")
+        # The barrier closed before the alarm started
+        assert arduino.writes[:3] == [OPEN, CLOSE, OPEN]
+    finally:
+        gate.stop()
+
+
+def test_deferred_alarm_keeps_highest_priority():
+    gate, _ = make_gate()
+    try:
+        gate.open_gate(0.1)
+        gate.alarm("NO_ENTRY")
+        gate.alarm("DENIED")
+        assert wait_until(lambda: gate.active == "NO_ENTRY")
+    finally:
+        gate.stop()
+
+
+def test_lower_priority_alarm_is_ignored():
+    gate, _ = make_gate()
+    try:
+        assert gate.alarm("NO_ENTRY")
+        assert not gate.alarm("DENIED")
+        assert gate.active == "NO_ENTRY"
+    finally:
+        gate.stop()
+
+
+def test_cancel_drops_deferred_alarm_and_closes():
+    gate, arduino = make_gate()
+    try:
+        gate.open_gate(5)
+        gate.alarm("DENIED")
+        gate.cancel()
+        assert gate.active is None
+        assert arduino.writes[-1] == CLOSE
+        time.sleep(0.1)
+        assert gate.active is None
+    finally:
+        gate.stop()
@@ -0,0 +1,116 @@
+from datetime import datetime
+
+import pytest
+
+psycopg2 = pytest.importorskip("psycopg2")
+
+from incident_writer import Incident, IncidentWriter, _append
+
+
+class FakeDatabase:
+    """Stands in for IncidentWriter._insert: rejects plates in `bad`, fails while offline"""
+
+    def __init__(self, bad=()):
+        self.rows = []
+        self.bad = set(bad)
+        self.online = True
+        self.fail_after = None  # go offline after this many more successful inserts
+
+    def insert(self, incidents):
+        if not self.online:
+            raise psycopg2.OperationalError("connection refused")
+        if any(i.car_plate in self.bad for i in incidents):
+            raise psycopg2.Error("invalid input")
+        if self.fail_after is not None:
+            if self.fail_after == 0:
+                self.online = False
+                raise psycopg2.OperationalError("connection lost")
+            self.fail_after -= 1
+        self.rows.extend(incidents)
+
+
+def incident(plate, minute=0):
+    return Incident(plate, "UNAUTHORIZED_EXIT", datetime(2026, 1, 1, 8, minute), "test", None)
+
+
+def make_writer(tmp_path, db):
+    writer = IncidentWriter(spool_path=str(tmp_path / "spool.jsonl"))
+    writer._insert = db.insert
+    return writer
+
+
+def spooled(path):
+    with open(path) as f:
+        return [line for line in f if line.strip()]
+
+
+def test_offline_batch_is_spooled_and_replayed_in_order(tmp_path):
+    db = FakeDatabase()
+    writer = make_writer(tmp_path, db)
+    db.online = False
+    writer._write([incident("RAA001A", 0), incident("RAA002A", 1)])
+    assert len(spooled(writer.spool_path)) == 2
+
+    db.online = True
+    writer._replay()
+    assert [i.car_plate for i in db.rows] == ["RAA001A", "RAA002A"]
+    assert db.rows[0].incident_time == datetime(2026, 1, 1, 8, 0)
+    assert not (tmp_path / "spool.jsonl").exists()
+
+
+def test_replay_sets_aside_only_rejected_rows(tmp_path):
+    db = FakeDatabase(bad={"BAD"})
+    writer = make_writer(tmp_path, db)
+    writer._spool([incident("RAA001A"), incident("BAD"), incident("RAA003A")])
+
+    writer._replay()
+    assert [i.car_plate for i in db.rows] == ["RAA001A", "RAA003A"]
+    assert len(spooled(writer.rejected_path)) == 1
+    assert not (tmp_path / "spool.jsonl").exists()
+
+
+def test_replay_keeps_unwritten_rows_when_going_offline(tmp_path):
+    db = FakeDatabase(bad={"BAD"})
+    writer = make_writer(tmp_path, db)
+    writer._spool([incident("RAA001A"), incident("BAD"), incident("RAA003A"), incident("RAA004A")])
+    db.fail_after = 1  # RAA001A goes in one by one, then the connection drops
+
+    writer._replay()
+    assert [i.car_plate for i in db.rows] == ["RAA001A"]
+    assert len(spooled(writer.rejected_path)) == 1
+    assert len(spooled(writer.spool_path)) == 2
+
+    db.online, db.fail_after = True, None
+    writer._replay()
+    assert [i.car_plate for i in db.rows] == ["RAA001A", "RAA003A", "RAA004A"]
+
+
+def test_writers_sharing_a_spool_replay_each_line_once(tmp_path):
+    db = FakeDatabase()
+    entry, exit_ = make_writer(tmp_path, db), make_writer(tmp_path, db)
+    db.online = False
+    entry._write([incident("RAA001A")])
+    exit_._write([incident("RAA002A")])
+
+    db.online = True
+    entry._replay()
+    exit_._replay()
+    assert sorted(i.car_plate for i in db.rows) == ["RAA001A", "RAA002A"]
+
+
+def test_rejected_fresh_batch_writes_the_good_rows(tmp_path):
+    db = FakeDatabase(bad={"BAD"})
+    writer = make_writer(tmp_path, db)
+    writer._write([incident("RAA001A"), incident("BAD")])
+    assert [i.car_plate for i in db.rows] == ["RAA001A"]
+    assert len(spooled(writer.rejected_path)) == 1
+    assert not (tmp_path / "spool.jsonl").exists()
+
+
+def test_append_round_trips_through_the_spool(tmp_path):
+    db = FakeDatabase()
+    writer = make_writer(tmp_path, db)
+    original = incident("RAA001A")._replace(additional_info="entry #4")
+    _append(writer.spool_path, [original])
+    writer._replay()
+    assert db.rows == [original]
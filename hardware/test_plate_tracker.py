@@ -0,0 +1,68 @@
+import numpy as np
+
+from motion_gate import MotionGate
+from plate_recognition import PlateRead
+from plate_tracker import MAX_ATTEMPTS, MAX_AGE, PlateTracker
+
+BOX = (100, 100, 300, 160)
+
+
+class FakeRecognizer:
+    """Detects BOX in every frame and returns the queued OCR texts in order"""
+
+    def __init__(self, plates):
+        self.plates = list(plates)
+
+    def boxes(self, image, detections):
+        return np.array([BOX]), np.array([0.99])
+
+    def read_boxes(self, image, boxes, box_confidences):
+        return [
+            PlateRead(self.plates.pop(0), "", 0.99, tuple(box), 0.99, None, None)
+            for box in boxes
+        ]
+
+
+def lane_should_infer(motion, tracker, image, now):
+    # Mirrors EntryLane/ExitLane.should_infer without the distance sensor
+    moving = motion.should_infer(image)
+    return moving or tracker.pending(now)
+
+
+def test_stationary_car_with_invalid_moving_reads_is_decided():
+    motion = MotionGate(stable_frames=2)
+    tracker = PlateTracker()
+    recognizer = FakeRecognizer([None, None, None, "RAB123C", "RAB123C"])
+    static = np.full((240, 320, 3), 80, dtype=np.uint8)
+    now, plates = 0.0, []
+
+    # The car drives in: every frame moves, every read is blurry (invalid)
+    for i in range(2):
+        frame = np.full((240, 320, 3), 40 + 60 * i, dtype=np.uint8)
+        assert lane_should_infer(motion, tracker, frame, now)
+        plates += tracker.read(recognizer, frame, None, now)[1]
+        now += 0.1
+
+    # The car stands still past the motion gate's single settled pass and
+    # beyond MAX_AGE; the pending track keeps it under inference
+    inferred = 0
+    while not plates and now < 3 * MAX_AGE:
+        if lane_should_infer(motion, tracker, static, now):
+            inferred += 1
+            plates += tracker.read(recognizer, static, None, now)[1]
+        now += 1.0
+
+    assert plates == ["RAB123C"]
+    assert inferred > 1
+    assert not tracker.pending(now)
+    assert not motion.should_infer(static)
+
+
+def test_unreadable_track_stops_requesting_frames():
+    tracker = PlateTracker()
+    recognizer = FakeRecognizer([None] * MAX_ATTEMPTS)
+    image = np.zeros((240, 320, 3), dtype=np.uint8)
+    for i in range(MAX_ATTEMPTS):
+        assert tracker.pending(i * 0.1) or i == 0
+        tracker.read(recognizer, image, None, i * 0.1)
+    assert not tracker.pending(MAX_ATTEMPTS * 0.1)
@@ -0,0 +1,121 @@
+"""
+Export the trained plate detector for the CPU-only gate cabinets.
+
+    python export_model.py --format onnx       # -> weights/best_int8.onnx
+    python export_model.py --format openvino   # -> weights/best_int8_openvino_model/
+
+Both exports use a dynamic batch dimension (for the supervisor's batched
+inference) and INT8 quantization calibrated on model_dev/dataset. Pass
+--no-int8 for a float export. Select the result on the gates with
+DETECTOR_RUNTIME=onnx|openvino (see hardware/plate_detector.py).
+"""
+import argparse
+import shutil
+import sys
+import tempfile
+from pathlib import Path
+
+MODEL_DEV = Path(__file__).resolve().parents[1]
+WEIGHTS = MODEL_DEV / "runs/detect/train/weights/best.pt"
+DATASET = MODEL_DEV / "dataset"
+CALIBRATION_IMAGES = 100
+
+sys.path.insert(0, str(MODEL_DEV.parent / "hardware"))
+
+
+def write_data_yaml(directory):
+    """Calibration/validation set description for ultralytics"""
+    names = (DATASET / "labels/classes.txt").read_text().split()
+    path = Path(directory) / "data.yaml"
+    path.write_text(
+        f"path: {DATASET}\n"
+        "train: images\n"
+        "val: images\n"
+        f"names: {dict(enumerate(names))}\n"
+    )
+    return path
+
+
+def export_onnx(model, int8):
+    exported = Path(model.export(format="onnx", dynamic=True, simplify=True))
+    if not int8:
+        return exported
+
+    import cv2
+    from onnxruntime.quantization import (
+        CalibrationDataReader,
+        QuantFormat,
+        QuantType,
+        quantize_static,
+    )
+    from onnxruntime.quantization.shape_inference import quant_pre_process
+
+    from plate_detector import letterbox, to_tensor
+
+    class DatasetReader(CalibrationDataReader):
+        def __init__(self, input_name):
+            images = sorted((DATASET / "images").glob("*.jp*g"))[:CALIBRATION_IMAGES]
+            self._batches = iter(
+                {input_name: to_tensor([letterbox(cv2.imread(str(p)))[0]])}
+                for p in images
+            )
+
+        def get_next(self):
+            return next(self._batches, None)
+
+    import onnxruntime
+
+    input_name = onnxruntime.InferenceSession(
+        str(exported), providers=["CPUExecutionProvider"]
+    ).get_inputs()[0].name
+    prepared = exported.with_name("best_prepared.onnx")
+    target = exported.with_name("best_int8.onnx")
+    quant_pre_process(str(exported), str(prepared))
+    quantize_static(
+        str(prepared),
+        str(target),
+        DatasetReader(input_name),
+        quant_format=QuantFormat.QDQ,
+        activation_type=QuantType.QUInt8,
+        weight_type=QuantType.QInt8,
+        per_channel=True,
+    )
+    prepared.unlink()
+    return target
+
+
+def export_openvino(model, int8):
+    with tempfile.TemporaryDirectory() as tmp:
+        exported = Path(
+            model.export(
+                format="openvino",
+                dynamic=True,
+                int8=int8,
+                data=str(write_data_yaml(tmp)) if int8 else None,
+            )
+        )
+    if int8 and exported.name != "best_int8_openvino_model":
+        target = exported.with_name("best_int8_openvino_model")
+        shutil.rmtree(target, ignore_errors=True)
+        exported.rename(target)
+        exported = target
+    return exported
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--format", choices=["onnx", "openvino"], default="onnx")
+    parser.add_argument("--no-int8", action="store_true", help="skip INT8 quantization")
+    parser.add_argument("--weights", default=str(WEIGHTS))
+    args = parser.parse_args()
+
+    from ultralytics import YOLO
+
+    model = YOLO(args.weights)
+    export = export_onnx if args.format == "onnx" else export_openvino
+    path = export(model, int8=not args.no_int8)
+    print(f"[EXPORT] Wrote {path}")
+
+
+if __name__ == "__main__":
+    main()
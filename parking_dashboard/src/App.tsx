@@ -13,8 +13,13 @@ import {
   Wifi,
   WifiOff,
 } from "lucide-react";
-import type { ParkingEntry, SecurityIncident } from "./types/type";
-import { fetchParkingEntries, fetchSecurityIncidents } from "./services/api";
+import type { ParkingEntry, SecurityIncident, Stats } from "./types/type";
+import {
+  fetchParkingEntries,
+  fetchSecurityIncidents,
+  fetchStats,
+  subscribeToChanges,
+} from "./services/api";
 import { StatCard } from "./components/StatCard";
 import { IncidentBadge } from "./components/IncidentBadge";
 import {
@@ -53,12 +58,26 @@ Chart.register(
   DoughnutController
 );
 
+const STATS_REFRESH_DELAY = 1000; // ms; one stats reload per burst of changes
+
+// Replace a row by id (or add it), keeping the list newest first
+const upsertById = <T extends { id: number }>(
+  rows: T[],
+  row: T,
+  timeKey: keyof T
+): T[] =>
+  [row, ...rows.filter((r) => r.id !== row.id)].sort(
+    (a, b) =>
+      String(b[timeKey]).localeCompare(String(a[timeKey])) || b.id - a.id
+  );
+
 const Dashboard = () => {
   const [activeTab, setActiveTab] = useState("overview");
   const [parkingEntries, setParkingEntries] = useState<ParkingEntry[]>([]);
   const [securityIncidents, setSecurityIncidents] = useState<
     SecurityIncident[]
   >([]);
+  const [stats, setStats] = useState<Stats | null>(null);
   const [isLiveMode, setIsLiveMode] = useState(true);
   const [currentTime, setCurrentTime] = useState(new Date());
   const [loading, setLoading] = useState(true);
@@ -72,17 +91,20 @@ const Dashboard = () => {
   const barChartRef = useRef<ChartCanvas | null>(null);
   const lineChartRef = useRef<ChartCanvas | null>(null);
   const doughnutChartRef = useRef<ChartCanvas | null>(null);
+  const statsTimerRef = useRef<ReturnType<typeof setTimeout> | null>(null);
   // Load data function
   const loadData = async () => {
     try {
       setLoading(true);
       setError(null);
-      const [entries, incidents] = await Promise.all([
+      const [entries, incidents, latestStats] = await Promise.all([
         fetchParkingEntries(),
         fetchSecurityIncidents(),
+        fetchStats(),
       ]);
       setParkingEntries(entries);
       setSecurityIncidents(incidents);
+      setStats(latestStats);
       setLastUpdate(new Date());
     } catch (err) {
       setError(
@@ -94,18 +116,43 @@ const Dashboard = () => {
     }
   };
 
-  // Auto-refresh data when in live mode
-  useEffect(() => {
-    loadData(); // Initial load
+  // The rollups change with every pushed row; reload them once per burst
+  const scheduleStatsRefresh = () => {
+    if (statsTimerRef.current) return;
+    statsTimerRef.current = setTimeout(async () => {
+      statsTimerRef.current = null;
+      try {
+        setStats(await fetchStats());
+      } catch (err) {
+        console.error("Error loading stats:", err);
+      }
+    }, STATS_REFRESH_DELAY);
+  };
 
-    let dataInterval: NodeJS.Timeout;
-    if (isLiveMode) {
-      dataInterval = setInterval(loadData, 30000); // Refresh every 30 seconds
+  // Live mode: load once, then apply the rows the server pushes
+  useEffect(() => {
+    if (!isLiveMode) {
+      loadData();
+      return;
     }
 
-    return () => {
-      if (dataInterval) clearInterval(dataInterval);
-    };
+    return subscribeToChanges({
+      onEntry: (entry) => {
+        setParkingEntries((prev) => upsertById(prev, entry, "entry_time"));
+        scheduleStatsRefresh();
+        setLastUpdate(new Date());
+      },
+      onIncident: (incident) => {
+        setSecurityIncidents((prev) =>
+          upsertById(prev, incident, "incident_time")
+        );
+        scheduleStatsRefresh();
+        setLastUpdate(new Date());
+      },
+      // Fires on (re)connect too, which also covers the initial load
+      onResync: loadData,
+      onError: () => setError("Live updates disconnected, reconnecting..."),
+    });
   }, [isLiveMode]);
 
   // Clock timer
@@ -114,15 +161,14 @@ const Dashboard = () => {
     return () => clearInterval(timer);
   }, []);
 
-  // Calculate statistics
-  const totalRevenue = parkingEntries
-    .filter((e) => e.payment_status)
-    .reduce((sum, e) => sum + (e.due_payment || 0), 0);
-  const activeVehicles = parkingEntries.filter((e) => !e.exit_time).length;
-  const totalIncidents = securityIncidents.length;
-  const criticalIncidents = securityIncidents.filter(
-    (i) => i.incident_type === "UNAUTHORIZED_EXIT"
-  ).length;
+  // Statistics come from the server's rollups, not the loaded page of rows
+  const totalRevenue = stats?.total_revenue ?? 0;
+  const activeVehicles = stats?.occupancy ?? 0;
+  const unpaidEntries = stats?.unpaid ?? 0;
+  const totalIncidents = stats?.incidents.total ?? 0;
+  const unresolvedIncidents = stats?.incidents.unresolved ?? 0;
+  const criticalIncidents =
+    stats?.incidents.by_type["UNAUTHORIZED_EXIT"]?.total ?? 0;
 
   const initializeCharts = useCallback(() => {
     const destroyChart = (ref: React.RefObject<ChartCanvas | null>) => {
@@ -220,14 +266,21 @@ const Dashboard = () => {
     if (lineChartRef.current) {
       const ctx = lineChartRef.current.getContext("2d");
       if (!ctx) return;
+      const dailyRevenue = (stats?.revenue_daily ?? []).slice(-7);
       new Chart(lineChartRef.current, {
         type: "line",
         data: {
-          labels: ["May 30", "May 31", "Jun 1", "Jun 2"],
+          labels: dailyRevenue.map((d) =>
+            // Day buckets are local dates; parse them as local midnight
+            new Date(`${d.start}T00:00`).toLocaleDateString(undefined, {
+              month: "short",
+              day: "numeric",
+            })
+          ),
           datasets: [
             {
               label: "Daily Revenue",
-              data: [8500, 12300, 15600, totalRevenue],
+              data: dailyRevenue.map((d) => d.revenue),
               borderColor: "#10B981",
               backgroundColor: "rgba(16, 185, 129, 0.1)",
               borderWidth: 3,
@@ -301,8 +354,8 @@ const Dashboard = () => {
     activeVehicles,
     parkingEntries,
     securityIncidents,
+    stats,
     totalIncidents,
-    totalRevenue,
   ]);
 useEffect(() => {
     if (activeTab === "analytics" && !loading && parkingEntries.length > 0) {
@@ -468,7 +521,7 @@ useEffect(() => {
                 icon={DollarSign}
                 color="from-green-500 to-emerald-600"
                 trend="+12%"
-                subtitle="This month"
+                subtitle={`${unpaidEntries} unpaid entries`}
               />
               <StatCard
                 title="Active Vehicles"
@@ -484,7 +537,7 @@ useEffect(() => {
                 icon={AlertTriangle}
                 color="from-orange-500 to-red-600"
                 trend="+5"
-                subtitle="Last 24 hours"
+                subtitle={`${unresolvedIncidents} unresolved`}
               />
               <StatCard
                 title="System Status"
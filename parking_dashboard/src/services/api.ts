@@ -1,12 +1,21 @@
 import axios, { AxiosError } from "axios";
-import type { ParkingEntry, SecurityIncident } from "../types/type";
+import type {
+  Page,
+  ParkingEntry,
+  SecurityIncident,
+  Stats,
+} from "../types/type";
 
 const API_BASE_URL = "http://localhost:5000/api";
+const PAGE_SIZE = 500;
 
 export const fetchParkingEntries = async (): Promise<ParkingEntry[]> => {
   try {
-    const response = await axios.get(`${API_BASE_URL}/parking_entries`);
-    return response.data;
+    const response = await axios.get<Page<ParkingEntry>>(
+      `${API_BASE_URL}/parking_entries`,
+      { params: { limit: PAGE_SIZE } }
+    );
+    return response.data.items;
   } catch (error) {
     throw new Error(
       `Failed to fetch parking entries: ${(error as AxiosError).message}`
@@ -16,11 +25,48 @@ export const fetchParkingEntries = async (): Promise<ParkingEntry[]> => {
 
 export const fetchSecurityIncidents = async (): Promise<SecurityIncident[]> => {
   try {
-    const response = await axios.get(`${API_BASE_URL}/security_incidents`);
-    return response.data;
+    const response = await axios.get<Page<SecurityIncident>>(
+      `${API_BASE_URL}/security_incidents`,
+      { params: { limit: PAGE_SIZE } }
+    );
+    return response.data.items;
   } catch (error) {
     throw new Error(
       `Failed to fetch security incidents: ${(error as AxiosError).message}`
     );
   }
 };
+
+// Occupancy, revenue and incident counts, maintained server-side
+export const fetchStats = async (): Promise<Stats> => {
+  try {
+    const response = await axios.get<Stats>(`${API_BASE_URL}/stats`);
+    return response.data;
+  } catch (error) {
+    throw new Error(`Failed to fetch stats: ${(error as AxiosError).message}`);
+  }
+};
+
+export interface ChangeHandlers {
+  onEntry: (entry: ParkingEntry) => void;
+  onIncident: (incident: SecurityIncident) => void;
+  // Changes may have been missed (first connect, reconnect, server resync)
+  onResync: () => void;
+  onError?: () => void;
+}
+
+// Live inserts/updates pushed by GET /api/events; returns an unsubscribe function
+export const subscribeToChanges = (handlers: ChangeHandlers): (() => void) => {
+  const source = new EventSource(`${API_BASE_URL}/events`);
+  source.addEventListener("parking_entry", (event) =>
+    handlers.onEntry(JSON.parse((event as MessageEvent).data))
+  );
+  source.addEventListener("security_incident", (event) =>
+    handlers.onIncident(JSON.parse((event as MessageEvent).data))
+  );
+  source.addEventListener("resync", () => handlers.onResync());
+  // EventSource reconnects by itself; reload once it is back
+  source.onopen = () => handlers.onResync();
+  source.onerror = () => handlers.onError?.();
+  return () => source.close();
+};
@@ -18,3 +18,28 @@ export interface SecurityIncident {
   resolution_notes: string | null;
   additional_info: string | null;
 }
+
+export interface Page<T> {
+  items: T[];
+  next_cursor: string | null;
+}
+
+export interface RevenueBucket {
+  start: string;
+  revenue: number;
+  payments: number;
+}
+
+export interface IncidentCount {
+  total: number;
+  unresolved: number;
+}
+
+export interface Stats {
+  occupancy: number;
+  unpaid: number;
+  total_revenue: number;
+  revenue_hourly: RevenueBucket[];
+  revenue_daily: RevenueBucket[];
+  incidents: IncidentCount & { by_type: Record<string, IncidentCount> };
+}
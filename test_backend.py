@@ -0,0 +1,37 @@
+import base64
+from datetime import datetime
+
+import pytest
+
+pytest.importorskip("flask")
+pytest.importorskip("flask_cors")
+pytest.importorskip("psycopg2")
+
+from backend import decode_cursor, encode_cursor
+
+
+def test_cursor_round_trips():
+    timestamp = datetime(2026, 1, 1, 8, 30, 15, 123456)
+    cursor = encode_cursor(timestamp, 42)
+    assert decode_cursor(cursor) == (timestamp, 42)
+
+
+def test_cursor_is_url_safe():
+    cursor = encode_cursor(datetime(2026, 1, 1), 10**12)
+    assert all(c.isalnum() or c in "-_=" for c in cursor)
+
+
+@pytest.mark.parametrize(
+    "cursor",
+    [
+        "not base64!",
+        base64.urlsafe_b64encode(b"2026-01-01T00:00:00").decode(),
+        base64.urlsafe_b64encode(b"yesterday|42").decode(),
+        base64.urlsafe_b64encode(b"2026-01-01T00:00:00|forty-two").decode(),
+        base64.urlsafe_b64encode(b"2026-01-01T00:00:00|1|2").decode(),
+        base64.urlsafe_b64encode(b"\xff\xfe").decode(),
+    ],
+)
+def test_invalid_cursor_is_value_error(cursor):
+    with pytest.raises(ValueError, match="Invalid cursor"):
+        decode_cursor(cursor)
@@ -0,0 +1,11 @@
+"""
+Production entry point for the backend API.
+
+    gunicorn -c gunicorn.conf.py wsgi:app
+
+`python backend.py` still starts Flask's development server, for local work
+only.
+"""
+from backend import app
+
+__all__ = ["app"]